@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -78,7 +81,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'user.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -101,7 +104,7 @@ ROOT_URLCONF = 'backend.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / "poster" / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -181,10 +184,51 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), "mediafiles")
 MEDIA_URL = "/api/media/"
+# "django" streams the files itself, "x-accel-redirect" (nginx) and "x-sendfile" (apache) leave it to the front proxy
+MEDIA_SERVING = os.getenv("MEDIA_SERVING", "django")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
 
 APPEND_SLASH = False
 
 ASGI_APPLICATION = "backend.asgi.application"
+# the local memory fallback is per process, invalidations don't reach the other workers
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL"),
+    } if os.getenv("REDIS_CACHE_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+FRIENDS_CACHE_VERSION = 1  # bump when the cached format changes
+FRIENDS_CACHE_TIMEOUT = 60 * 60
+
+GOOGLE_CLIENT_IDS = [client_id for client_id in os.getenv("GOOGLE_CLIENT_IDS", "").split(",") if client_id]
+if not DEBUG and not GOOGLE_CLIENT_IDS:
+    raise ImproperlyConfigured("Set GOOGLE_CLIENT_IDS, without an audience every Google sign-in is rejected.")
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_JWKS_CACHE_PATH = os.getenv("GOOGLE_JWKS_CACHE_PATH", os.path.join(tempfile.gettempdir(), "google_jwks.json"))
+GOOGLE_JWKS_MIN_REFRESH_INTERVAL = 60  # seconds between refreshes forced by an unknown key id
+GOOGLE_ID_TOKEN_LEEWAY = 30  # seconds of clock skew allowed on exp/iat
+
+TOKEN_AUTH_CACHE_TIMEOUT = 60
+TOKEN_AUTH_LOCAL_CACHE_TIMEOUT = 10
+TOKEN_AUTH_LOCAL_CACHE_SIZE = 10_000
+
+USER_SEARCH_PAGE_SIZE = 20
+USER_SEARCH_MAX_LENGTH = 32
+
+CHAT_FLUSH_SIZE = 200  # buffered messages written per bulk insert
+CHAT_FLUSH_INTERVAL = 250  # milliseconds a message waits in the buffer at most
+CHAT_SPOOL_PATH = os.getenv("CHAT_SPOOL_PATH", os.path.join(tempfile.gettempdir(), "chat_spool.jsonl"))
+SNOWFLAKE_WORKER_ID = int(os.getenv("SNOWFLAKE_WORKER_ID", 0))  # 0-255, give every process that writes messages its own
+
+FRIEND_SUGGESTIONS_COUNT = 50  # stored per user
+FRIEND_SUGGESTIONS_BATCH_SIZE = 500  # users per worker task
+FRIEND_SUGGESTIONS_MUTUAL_WEIGHT = 1.0
+FRIEND_SUGGESTIONS_EVENT_WEIGHT = 2.0
+FRIEND_SUGGESTIONS_MAX_EVENT_MEMBERS = 200  # larger events don't count as co-attendance
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -194,6 +238,54 @@ CHANNEL_LAYERS = {
     },
 }
 
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', "redis://127.0.0.1:6379/0")
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() in ['true', '1', 't']
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ROUTES = {
+    # lifecycle fan-out runs on its own queue and workers, away from the web tier
+    "event.tasks.dispatch_event_lifecycle": {"queue": "lifecycle"},
+    "event.tasks.run_event_lifecycle": {"queue": "lifecycle"},
+    "event.tasks.process_flashback_uploads": {"queue": "media"},
+    # runs its own process pool, start the worker with --pool solo
+    "event.tasks.moderate_flashbacks": {"queue": "moderation"},
+    "friendship.tasks.dispatch_friend_suggestions": {"queue": "suggestions"},
+    "friendship.tasks.refresh_friend_suggestions": {"queue": "suggestions"},
+}
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-event-lifecycle": {
+        "task": "event.tasks.dispatch_event_lifecycle",
+        "schedule": 30.0,
+    },
+    "moderate-flashbacks": {
+        "task": "event.tasks.moderate_flashbacks",
+        "schedule": 60.0,
+    },
+    "dispatch-friend-suggestions": {
+        "task": "friendship.tasks.dispatch_friend_suggestions",
+        "schedule": 24 * 60 * 60.0,
+    },
+}
+
+EVENT_LIFECYCLE_DISPATCH_LIMIT = 5000  # events leased per dispatch tick
+EVENT_LIFECYCLE_CHUNK_SIZE = 25  # events per worker task
+EVENT_LIFECYCLE_LEASE = timedelta(minutes=10)
+
+FLASHBACK_VARIANT_WIDTHS = (160, 480, 1080)
+FLASHBACK_VARIANT_FORMAT = "WEBP"  # or "JPEG"
+FLASHBACK_UPLOAD_MAX_SIZE = 30 * 1024 * 1024  # bytes
+FLASHBACK_UPLOAD_MAX_PIXELS = 60_000_000
+FLASHBACK_BULK_UPLOAD_MAX = 50  # files per bulk request, keep under DATA_UPLOAD_MAX_NUMBER_FILES
+FLASHBACK_BULK_UPLOAD_MAX_SIZE = 300 * 1024 * 1024  # bytes of files per bulk request
+
+POSTER_VERSION = 1  # bump to re-render every cached poster and QR code
+POSTER_PRERENDER_DAYS = 7
+EVENT_QRCODE_URL = os.getenv("EVENT_QRCODE_URL", "flashbacks://event/{event_id}")
+
+NSFW_CLASSIFIER = os.getenv("NSFW_CLASSIFIER", "utils.nsfw_detection.NullClassifier")
+NSFW_THRESHOLD = 0.8
+NSFW_BATCH_SIZE = 64
+NSFW_PROCESSES = int(os.getenv("NSFW_PROCESSES", 0))  # 0 is one per core
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
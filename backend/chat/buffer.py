@@ -0,0 +1,138 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+
+from chat.models import Message
+from utils.snowflake import next_id
+
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FIELDS = ("id", "event_id", "user_id", "parent_id", "content", "timestamp")
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages. Messages already carry their id and timestamp, they are
+    broadcast right away and written here with bulk_create once CHAT_FLUSH_SIZE are pending or
+    CHAT_FLUSH_INTERVAL milliseconds passed. Batches the database refuses, and whatever is pending
+    when the process exits, are appended to CHAT_SPOOL_PATH, see replay_chat_spool.
+    """
+
+    def __init__(self):
+        self.pending: dict[int, Message] = {}
+        self._lock = threading.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    def get(self, pk: int) -> Message | None:
+        return self.pending.get(pk)
+
+    def add(self, message: Message):
+        with self._lock:
+            self.pending[message.pk] = message
+            size = len(self.pending)
+
+        loop = asyncio.get_running_loop()
+        if size >= settings.CHAT_FLUSH_SIZE:
+            self._schedule_flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(settings.CHAT_FLUSH_INTERVAL / 1000, self._schedule_flush, loop)
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = loop.create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    def _take(self) -> list[Message]:
+        with self._lock:
+            batch, self.pending = list(self.pending.values()), {}
+        return batch
+
+    async def flush(self):
+        batch = self._take()
+        if batch:
+            await sync_to_async(self.write)(batch)
+
+    def flush_sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._take()
+        if batch:
+            self.write(batch)
+
+    @staticmethod
+    def write(batch: list[Message]):
+        try:
+            write_messages(batch)
+        except DatabaseError:
+            logger.exception("could not write %d chat messages, spooling them to %s", len(batch), settings.CHAT_SPOOL_PATH)
+            spool(batch)
+
+
+def write_messages(batch: list[Message]):
+    """
+    Insert the batch. Messages written before, e.g. by an earlier replay, are skipped, a message whose id
+    another message already took is stored under a new id, nothing is dropped without a log.
+    """
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(batch, batch_size=settings.CHAT_FLUSH_SIZE)
+        return
+    except IntegrityError:
+        pass  # the whole batch was rolled back, sort the conflicting messages out one by one
+
+    stored = {
+        pk: row for pk, *row in Message.objects.filter(pk__in=[message.pk for message in batch]).values_list(
+            "pk", "event_id", "user_id", "content"
+        )
+    }
+    for message in batch:
+        if message.pk in stored:
+            if stored[message.pk] == [message.event_id, message.user_id, message.content]:
+                continue
+            taken_id, message.pk = message.pk, next_id()
+            logger.error(
+                "chat message id %d is taken by another message, stored it as %d, check SNOWFLAKE_WORKER_ID",
+                taken_id, message.pk
+            )
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message])
+        except IntegrityError: logger.warning("dropped chat message %d, its event or parent is gone", message.pk)
+
+
+def spool(batch: list[Message]):
+    with open(settings.CHAT_SPOOL_PATH, "a") as file:
+        for message in batch:
+            row = {field: getattr(message, field) for field in SPOOL_FIELDS}
+            row["timestamp"] = message.timestamp.isoformat()
+            file.write(json.dumps(row) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def read_spool(path: str) -> list[Message]:
+    from django.utils.dateparse import parse_datetime
+
+    messages = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                row = json.loads(line)
+                messages.append(Message(**{**row, "timestamp": parse_datetime(row["timestamp"])}))
+    return messages
+
+
+message_buffer = MessageBuffer()
+atexit.register(message_buffer.flush_sync)
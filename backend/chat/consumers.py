@@ -3,6 +3,8 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth.models import AnonymousUser
 from asgiref.sync import sync_to_async
 
+from chat.buffer import message_buffer
+from chat.models import Message
 from chat.serializers import MessageWritableSerializer, MessageSerializer
 from event.models import Event
 
@@ -19,10 +21,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def user(self):
         return self.scope.get("user", None)
 
-    @sync_to_async
-    def save_message_to_db(self, message_serializer: MessageWritableSerializer):
-        print(self.user, self.event_id)
-        return message_serializer.save(user=self.user, event_id=self.event_id)
+    def build_message(self, data: dict) -> tuple[Message, dict] | None:
+        """Validate and serialize a new message without saving it, its id and timestamp are assigned here."""
+        serializer = MessageWritableSerializer(data=data, context={"buffer": message_buffer})
+        if not serializer.is_valid():
+            return None
+
+        message = Message(user=self.user, event_id=self.event_id, **serializer.validated_data)
+        return message, MessageSerializer(instance=message).data
 
     @staticmethod
     @sync_to_async
@@ -64,22 +70,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
         try: data = json.loads(text_data)
         except json.decoder.JSONDecodeError: return
 
-        # add parents info to message
-        serializer = MessageWritableSerializer(data=data)
-        if not serializer.is_valid():
+        if not isinstance(data, dict):
             return
 
-        instance = await self.save_message_to_db(serializer)
-        resp_serializer = MessageSerializer(instance=instance)
+        # only replies need the database to look their parent up, any parent value given (even 0 or "") goes through it
+        if data.get("parent") is None:
+            built = self.build_message(data)
+        else:
+            built = await sync_to_async(self.build_message)(data)
+        if built is None:
+            return
+        message, message_data = built
 
-        # Broadcast the message to the group for the specific event
+        # Broadcast the message to the group for the specific event, it is written behind, see chat.buffer
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 "type": self.SOCKET_EVENT_TYPE,
-                **resp_serializer.data,
+                **message_data,
             }
         )
+        message_buffer.add(message)
 
     # Send the message to WebSocket clients connected to the group
     async def chat_message(self, event):
@@ -0,0 +1,29 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from chat.buffer import read_spool, spool, write_messages
+
+
+class Command(BaseCommand):
+    help = "Write the chat messages spooled to CHAT_SPOOL_PATH while the database was unavailable."
+
+    def handle(self, *args, **options):
+        path = settings.CHAT_SPOOL_PATH
+        if not os.path.exists(path):
+            self.stdout.write("nothing to replay")
+            return
+
+        # take the file over first, running servers keep spooling to a new one
+        replaying = f"{path}.{os.getpid()}.replay"
+        os.replace(path, replaying)
+        messages = read_spool(replaying)
+        try:
+            write_messages(messages)
+        except DatabaseError:
+            spool(messages)  # back in line for the next run
+            raise
+        finally:
+            os.remove(replaying)
+        self.stdout.write(f"replayed {len(messages)} messages")
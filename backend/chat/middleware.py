@@ -1,8 +1,9 @@
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from rest_framework.authtoken.models import Token
 import urllib.parse
 
+from user.authentication import get_token_user
+
 
 class TokenAuthMiddleware:
     def __init__(self, inner):
@@ -11,7 +12,6 @@ class TokenAuthMiddleware:
     async def __call__(self, scope, receive, send):
         # Extract token from query parameters in the URL
         token_key = self.get_token_from_url(scope)
-        print(token_key)
         # Resolve the user based on the token
         scope['user'] = await self.get_user_from_token(token_key) if token_key else AnonymousUser()
 
@@ -30,8 +30,7 @@ class TokenAuthMiddleware:
         """
         Fetches the user associated with the provided token.
         """
-        try:
-            token = Token.objects.select_related('user').get(key=token_key)
-            return token.user
-        except Token.DoesNotExist:
+        user = get_token_user(token_key)
+        if user is None or not user.is_active:
             return AnonymousUser()
+        return user
@@ -1,14 +1,18 @@
 from django.db import models
+from django.utils import timezone
 
 from event.models import Event
 from user.models import User
+from utils.snowflake import next_id
 
 
 class Message(models.Model):
+    # assigned on creation, so a message can be broadcast before it is written, see chat.buffer
+    id = models.BigIntegerField(primary_key=True, default=next_id, editable=False)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     parent = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, default=None, related_name="replies", blank=True)
 
     def __str__(self):
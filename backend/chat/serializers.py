@@ -31,8 +31,21 @@ class MessageSerializer(serializers.ModelSerializer):
         ]
 
 
+class MessageParentField(serializers.PrimaryKeyRelatedField):
+    """Also accepts parents still waiting in the write-behind buffer passed as context["buffer"]."""
+
+    def to_internal_value(self, data):
+        buffer = self.context.get("buffer")
+        if buffer is not None:
+            try: message = buffer.get(int(data))
+            except (TypeError, ValueError): message = None
+            if message is not None:
+                return message
+        return super().to_internal_value(data)
+
+
 class MessageWritableSerializer(MessageSerializer):
-    parent = serializers.PrimaryKeyRelatedField(
+    parent = MessageParentField(
         queryset=Message.objects.all(),
         required=False,
         allow_null=True
@@ -1,3 +1,63 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from chat.buffer import message_buffer, write_messages
+from chat.models import Message
+from chat.routing import websocket_urlpatterns
+from event.models import Event
+from user.models import User
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ChatConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user", email="user@flashbacks.com")
+        now = timezone.now()
+        self.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        self.addCleanup(message_buffer.flush_sync)  # write what the test left in the buffer while its tables exist
+
+    async def connect(self) -> WebsocketCommunicator:
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/event/{self.event.pk}/chat/")
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_falsy_parents_are_validated_off_the_event_loop(self):
+        communicator = await self.connect()
+        for parent in (0, False):  # looked up in the database, no such message
+            await communicator.send_to(text_data=json.dumps({"content": "reply", "parent": parent}))
+        await communicator.send_to(text_data=json.dumps({"content": "hello", "parent": None}))
+
+        message = json.loads(await communicator.receive_from())
+        self.assertEqual((message["content"], message["parent"]), ("hello", None))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+class WriteMessagesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@flashbacks.com")
+        now = timezone.now()
+        cls.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+
+    def message(self, content: str, **kwargs) -> Message:
+        return Message(event=self.event, user=self.user, content=content, **kwargs)
+
+    def test_messages_written_before_are_skipped(self):
+        batch = [self.message("first"), self.message("second")]
+        write_messages(batch[:1])
+        write_messages(batch)  # e.g. a spool replayed after a partial write
+        self.assertEqual(list(Message.objects.order_by("pk").values_list("content", flat=True)), ["first", "second"])
+
+    def test_taken_id_is_replaced_not_dropped(self):
+        taken = self.message("first")
+        write_messages([taken])
+        with self.assertLogs("chat.buffer", "ERROR"):
+            write_messages([self.message("second", id=taken.pk)])
+        self.assertEqual(sorted(Message.objects.values_list("content", flat=True)), ["first", "second"])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from event.models import Event
+from event.status import EventStatus
+
+
+class Command(BaseCommand):
+    help = "Regenerate previews of closed events in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", type=int, action="append", dest="events", help="Only regenerate this event id.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter_by_status(EventStatus.CLOSED)
+        if options["events"]:
+            events = events.filter(pk__in=options["events"])
+
+        events_ids = list(events.order_by("pk").values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        for i in range(0, len(events_ids), batch_size):
+            Event.objects.filter(pk__in=events_ids[i:i + batch_size]).generate_previews()
+
+        self.stdout.write(f"Regenerated previews of {len(events_ids)} events.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from event.models import Flashback, FlashbackStatus
+from utils.nsfw_detection import get_last_batch_metrics
+
+
+class Command(BaseCommand):
+    help = "Show the moderation queue size, its lag and the throughput of the last batch."
+
+    def handle(self, *args, **options):
+        queue = Flashback.objects.filter(status=FlashbackStatus.IN_REVIEW).aggregate(
+            size=Count("pk"), oldest=Min("created_at")
+        )
+        lag = (timezone.now() - queue["oldest"]).total_seconds() if queue["oldest"] else 0.0
+        self.stdout.write(f"queue_size {queue['size']}")
+        self.stdout.write(f"queue_lag_seconds {lag:.1f}")
+
+        metrics = get_last_batch_metrics()
+        if metrics is not None:
+            self.stdout.write(f"last_batch_images {metrics['images']}")
+            self.stdout.write(f"last_batch_images_per_second {metrics['images_per_second']:.1f}")
+            self.stdout.write(f"last_batch_queue_lag_seconds {metrics['queue_lag']:.1f}")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from event.models import Event
+from event.posters import POSTER_TEMPLATES, POSTER_FORMATS, get_poster
+
+
+class Command(BaseCommand):
+    help = "Render the posters of the upcoming events ahead, so the first request is served from the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.POSTER_PRERENDER_DAYS)
+        parser.add_argument("--template", action="append", dest="templates", choices=POSTER_TEMPLATES)
+        parser.add_argument("--format", default="pdf", choices=POSTER_FORMATS)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        events = Event.objects.filter(end_at__gt=now, start_at__lte=now + timedelta(days=options["days"]))
+        templates = options["templates"] or POSTER_TEMPLATES
+
+        count = 0
+        for event in events.only("pk", "title", "emoji").iterator():
+            for template in templates:
+                get_poster(event, template, options["format"])
+            count += 1
+
+        self.stdout.write(f"Rendered posters of {count} events.")
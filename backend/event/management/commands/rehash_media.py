@@ -0,0 +1,66 @@
+import re
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from event.models import Flashback, FlashbackVariant
+
+
+CONTENT_ADDRESSED_NAME = re.compile(r"^flashback/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+class Command(BaseCommand):
+    help = "Move the flashback media stored under random names to the content addressed layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = Flashback._meta.get_field("media").storage
+        moved = deduplicated = 0
+
+        flashbacks = Flashback.objects.exclude(media="").exclude(media__isnull=True).only("media", "variants")
+        for flashback in flashbacks.iterator():
+            name = flashback.media.name
+            if CONTENT_ADDRESSED_NAME.match(name):
+                continue
+            if not storage.exists(name):
+                self.stdout.write(self.style.WARNING(f"{flashback}: {name} is missing"))
+                continue
+            if options["dry_run"]:
+                moved += 1
+                continue
+
+            old_variants = flashback.variants
+            with transaction.atomic():  # the new file and the rows pointing at it, see lock_name
+                with storage.open(name, "rb") as file:
+                    new_name = storage.save(name, File(file))
+                deduplicated += Flashback.objects.filter(media=new_name).exists()
+
+                variants = self.move_variants(old_variants, new_name)
+                flashback.set_variants(variants, media_name=new_name)
+            if len(variants) < len(old_variants):
+                flashback.generate_variants()  # some were missing, render them again from the moved original
+
+            Flashback.release_media(name, {})
+            for variant_name in set(old_variants.values()) - set(variants.values()):
+                if not FlashbackVariant.objects.filter(name=variant_name).exists():
+                    default_storage.delete(variant_name)
+            moved += 1
+
+        self.stdout.write(f"Moved {moved} files, {deduplicated} of them were duplicates.")
+
+    @staticmethod
+    def move_variants(variants: dict[str, str], media_name: str) -> dict[str, str]:
+        """Copy the variants to the names generate_variants gives the new original, missing ones are left out."""
+        moved = {}
+        for width, variant_name in variants.items():
+            new_name = Flashback.get_variant_name(media_name, width, variant_name.rsplit(".", 1)[-1])
+            if not default_storage.exists(new_name):  # a duplicate of the same content may have moved them already
+                if not default_storage.exists(variant_name):
+                    continue
+                with default_storage.open(variant_name, "rb") as file:
+                    new_name = default_storage.save(new_name, File(file))
+            moved[width] = new_name
+        return moved
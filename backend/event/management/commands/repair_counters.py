@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from event.models import Event, EventViewer
+
+
+class Command(BaseCommand):
+    help = "Recount the denormalized event and viewer counters that drifted."
+
+    def handle(self, *args, **options):
+        events_drifted = Event.objects.all().recount()
+        viewers_drifted = EventViewer.objects.all().recount_unseen()
+        self.stdout.write(f"Repaired {events_drifted} events and {viewers_drifted} viewers.")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from event.models import Event, EventViewer
+
+
+class Command(BaseCommand):
+    help = "Verify that the incrementally maintained viewers match a full rebuild."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", type=int, action="append", dest="events", help="Only verify this event id.")
+        parser.add_argument("--repair", action="store_true", help="Sync the events that drifted.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(eventviewer__isnull=False).distinct()
+        if options["events"]:
+            events = events.filter(pk__in=options["events"])
+
+        drifted = 0
+        for event in events.iterator():
+            problems = self.verify_event(event)
+            if not problems:
+                continue
+
+            drifted += 1
+            self.stdout.write(self.style.WARNING(f"{event}: {', '.join(problems)}"))
+            if options["repair"]:
+                event.sync_viewers()
+
+        self.stdout.write(f"Verified {events.count()} events, {drifted} drifted.")
+
+    @staticmethod
+    def verify_event(event: Event) -> list[str]:
+        problems = []
+
+        members_ids = event.get_members_ids()
+        expected_viewers = {
+            (user_id, user_id in members_ids) for user_id in members_ids | event.get_friends_viewers_ids()
+        }
+        viewers = set(EventViewer.objects.filter(event=event).values_list("user_id", "is_member"))
+        if viewers != expected_viewers:
+            problems.append(
+                f"{len(expected_viewers - viewers)} viewers missing, {len(viewers - expected_viewers)} unexpected"
+            )
+
+        return problems
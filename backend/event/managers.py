@@ -1,18 +1,169 @@
-from django.db import models
+from bisect import bisect_right
+from django.db import models, transaction
+from django.db.models.functions import Now, Random, RowNumber, Coalesce
 from event.status import EventStatus
 
 
 class EventQuerySet(models.QuerySet):
-    def filter_by_status(self, status: EventStatus) -> models.QuerySet:
-        print([
-            instance.id for instance in self.all() if instance.status == status
-        ])
+    def annotate_status(self) -> models.QuerySet:
+        return self.annotate(status_value=models.Case(
+            models.When(start_at__gt=Now(), then=models.Value(EventStatus.OPENED.value)),
+            models.When(end_at__lt=Now(), then=models.Value(EventStatus.CLOSED.value)),
+            default=models.Value(EventStatus.ACTIVE.value),
+            output_field=models.IntegerField(),
+        ))
 
-        return self.filter(id__in=[
-            instance.id for instance in self.all() if instance.status.value == status
-        ])
+    def filter_by_status(self, status: EventStatus | int) -> models.QuerySet:
+        status = EventStatus(status)
+        if status == EventStatus.OPENED:
+            return self.filter(start_at__gt=Now())
+        if status == EventStatus.CLOSED:
+            return self.filter(end_at__lt=Now())
+        return self.filter(start_at__lte=Now(), end_at__gte=Now())
+
+    def order_by_status(self, *fields: str) -> models.QuerySet:
+        return self.annotate_status().order_by("status_value", *fields)
+
+    def filter_lifecycle_due(self, now) -> models.QuerySet:
+        return self.filter(
+            models.Q(lifecycle_status=EventStatus.OPENED.value, start_at__lte=now) |
+            models.Q(lifecycle_status__lt=EventStatus.CLOSED.value, end_at__lt=now)
+        ).filter(
+            models.Q(lifecycle_lease__isnull=True) | models.Q(lifecycle_lease__lt=now)
+        ).order_by("end_at")
+
+    def recount(self) -> int:
+        """Recount the denormalized counters in bulk, returns the number of drifted events."""
+        from event.models import EventMember, Flashback
+
+        flashbacks_count = Coalesce(models.Subquery(
+            Flashback.objects.filter_ready().filter(event_member__event=models.OuterRef("pk")).order_by()
+            .values("event_member__event").annotate(count=models.Count("pk")).values("count")
+        ), 0)
+        members_count = Coalesce(models.Subquery(
+            EventMember.objects.filter(event=models.OuterRef("pk")).order_by()
+            .values("event").annotate(count=models.Count("pk")).values("count")
+        ), 0)
+
+        drifted = self.annotate(
+            actual_flashbacks_count=flashbacks_count, actual_members_count=members_count
+        ).exclude(
+            flashbacks_count=models.F("actual_flashbacks_count"), members_count=models.F("actual_members_count")
+        ).values("pk")
+        return self.model.objects.filter(pk__in=models.Subquery(drifted)).update(
+            flashbacks_count=flashbacks_count, members_count=members_count
+        )
+
+    def generate_previews(self):
+        """
+        Keep the previews whose flashback is still allowed, fill the free slots with random flashbacks
+        (ORDER BY random() per event, in one query) and renumber them from 1.
+        """
+        from event.models import (
+            EventPreview, Flashback, EventViewersMode, FlashbackVisibilityMode, EVENT_PREVIEW_COUNT_MAX
+        )
+
+        events_ids = list(self.values_list("pk", flat=True))
+        flashbacks = Flashback.objects.filter_ready().filter(event_member__event_id__in=events_ids).filter(
+            models.Q(event_member__event__viewers_mode=EventViewersMode.ONLY_MEMBERS) |
+            models.Q(visibility=FlashbackVisibilityMode.PUBLIC)
+        )
+
+        previews = EventPreview.objects.filter(event_id__in=events_ids)
+        valid_previews = previews.filter(flashback__in=flashbacks)
+        kept = {}
+        for preview in valid_previews.order_by("event_id", "order"):
+            kept.setdefault(preview.event_id, [])
+            if len(kept[preview.event_id]) < EVENT_PREVIEW_COUNT_MAX:
+                kept[preview.event_id].append(preview)
+
+        sampled = {}
+        for flashback_id, event_id in flashbacks.exclude(pk__in=valid_previews.values("flashback_id")).annotate(
+            rank=models.Window(RowNumber(), partition_by=models.F("event_member__event_id"), order_by=Random())
+        ).filter(rank__lte=EVENT_PREVIEW_COUNT_MAX).values_list("pk", "event_member__event_id"):
+            sampled.setdefault(event_id, []).append(flashback_id)
+
+        to_keep, to_create = [], []
+        for event_id in events_ids:
+            flashbacks_ids = [p.flashback_id for p in kept.get(event_id, [])] + sampled.get(event_id, [])
+            for order, flashback_id in enumerate(flashbacks_ids[:EVENT_PREVIEW_COUNT_MAX], start=1):
+                preview = next((p for p in kept.get(event_id, []) if p.flashback_id == flashback_id), None)
+                if preview is not None and preview.order == order:
+                    to_keep.append(preview.pk)
+                else:
+                    to_create.append(EventPreview(event_id=event_id, flashback_id=flashback_id, order=order))
+
+        # moved previews are re-inserted, the (event, order) constraint is not deferrable
+        with transaction.atomic():
+            previews.exclude(pk__in=to_keep).delete()
+            EventPreview.objects.bulk_create(to_create)
+
+
+class EventViewerQuerySet(models.QuerySet):
+    def for_feed(self) -> models.QuerySet:
+        from event.models import EventPreview
+
+        return self.select_related("event").annotate(end_at=models.F("event__end_at")).prefetch_related(
+            models.Prefetch(
+                "event__eventpreview_set",
+                queryset=EventPreview.objects.select_related("flashback").order_by("order"),
+                to_attr="ordered_previews"
+            )
+        )
+
+
+    def recount_unseen(self) -> int:
+        """Recount the unseen counters from the seen state, returns the number of drifted viewers."""
+        from event.models import Flashback
+
+        drifted = []
+        for event_id in self.order_by().values_list("event_id", flat=True).distinct():
+            flashbacks_ids = sorted(
+                Flashback.objects.filter_ready().filter(event_member__event_id=event_id).values_list("pk", flat=True)
+            )
+            for viewer in self.filter(event_id=event_id).only("seen_until", "seen_ids", "unseen_count"):
+                seen_count = bisect_right(flashbacks_ids, viewer.seen_until) + len(
+                    {pk for pk in viewer.seen_ids if pk > viewer.seen_until}.intersection(flashbacks_ids)
+                )
+                if viewer.unseen_count != len(flashbacks_ids) - seen_count:
+                    viewer.unseen_count = len(flashbacks_ids) - seen_count
+                    drifted.append(viewer)
+
+        self.model.objects.bulk_update(drifted, ["unseen_count"], batch_size=1000)
+        return len(drifted)
 
 
 class FlashbackQuerySet(models.QuerySet):
-    def first_unseen(self):
-        return self.filter(seen=False).order_by("created_at").first()
\ No newline at end of file
+    def filter_ready(self) -> models.QuerySet:
+        from event.models import FlashbackStatus
+        return self.filter(status=FlashbackStatus.READY)
+
+    def annotate_seen(self, event_viewer) -> models.QuerySet:
+        return self.annotate(is_seen=models.Case(
+            models.When(event_viewer.seen_q, then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def filter_by_seen(self, event_viewer, is_seen: bool = True) -> models.QuerySet:
+        if is_seen:
+            return self.filter(event_viewer.seen_q)
+        return self.exclude(event_viewer.seen_q)
+
+    def first_unseen(self, event_viewer):
+        return self.filter_by_seen(event_viewer, is_seen=False).order_by("created_at").first()
+
+    def filter_by_media_name(self, name: str) -> models.QuerySet:
+        """Flashbacks whose original or one of the variants is stored under the name."""
+        from event.models import FlashbackVariant
+        if not name.startswith("flashback/variants/"):
+            return self.filter(media=name)
+        return self.filter(pk__in=FlashbackVariant.objects.filter(name=name).values("flashback_id"))
+
+    def filter_visible_to(self, user) -> models.QuerySet:
+        """Ready flashbacks of the events the user views, private ones only for the event members."""
+        from event.models import EventMember, EventViewer, FlashbackVisibilityMode
+        event_id = models.OuterRef("event_member__event_id")
+        is_member = models.Exists(EventMember.objects.filter(event_id=event_id, user=user))
+        is_viewer = models.Exists(EventViewer.objects.filter(event_id=event_id, user=user))
+        return self.filter_ready().filter(is_member | (is_viewer & models.Q(visibility=FlashbackVisibilityMode.PUBLIC)))
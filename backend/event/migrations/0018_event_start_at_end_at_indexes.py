@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0017_delete_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_at'], name='event_start_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['end_at'], name='event_end_at_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:12
+
+from django.db import migrations, models
+
+
+def mark_generated_events_closed(apps, schema_editor):
+    # events whose viewers were already generated by a manual close don't need the hooks again
+    Event = apps.get_model("event", "Event")
+    EventViewer = apps.get_model("event", "EventViewer")
+    Event.objects.filter(pk__in=EventViewer.objects.values("event_id")).update(lifecycle_status=2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0018_event_start_at_end_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='lifecycle_lease',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='lifecycle_status',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('lifecycle_status', 0)), fields=['start_at'], name='event_activate_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('lifecycle_status__lt', 2)), fields=['end_at'], name='event_close_due_idx'),
+        ),
+        migrations.RunPython(mark_generated_events_closed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+def convert_flashback_viewers(apps, schema_editor):
+    EventViewer = apps.get_model("event", "EventViewer")
+    Flashback = apps.get_model("event", "Flashback")
+    FlashbackViewer = apps.get_model("event", "FlashbackViewer")
+
+    seen = {}
+    for event_viewer_id, flashback_id in FlashbackViewer.objects.filter(is_seen=True).values_list(
+        "event_viewer_id", "flashback_id"
+    ):
+        seen.setdefault(event_viewer_id, set()).add(flashback_id)
+
+    event_viewers = list(EventViewer.objects.filter(pk__in=seen.keys()))
+    flashbacks = {}
+    for flashback_id, event_id in Flashback.objects.filter(
+        event_member__event_id__in={ev.event_id for ev in event_viewers}
+    ).order_by("pk").values_list("pk", "event_member__event_id"):
+        flashbacks.setdefault(event_id, []).append(flashback_id)
+
+    for event_viewer in event_viewers:
+        seen_ids = seen[event_viewer.pk]
+        for flashback_id in flashbacks.get(event_viewer.event_id, []):
+            if flashback_id not in seen_ids:
+                break
+            event_viewer.seen_until = flashback_id
+        event_viewer.seen_ids = sorted(pk for pk in seen_ids if pk > event_viewer.seen_until)
+
+    EventViewer.objects.bulk_update(event_viewers, ["seen_until", "seen_ids"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0019_event_lifecycle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventviewer',
+            name='seen_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='eventviewer',
+            name='seen_until',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(convert_flashback_viewers, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='FlashbackViewer',
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:15
+
+from bisect import bisect_right
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    return Coalesce(models.Subquery(
+        queryset.order_by().values(field).annotate(count=models.Count("pk")).values("count")
+    ), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Event = apps.get_model("event", "Event")
+    EventMember = apps.get_model("event", "EventMember")
+    EventViewer = apps.get_model("event", "EventViewer")
+    Flashback = apps.get_model("event", "Flashback")
+
+    Event.objects.update(
+        flashbacks_count=count_subquery(
+            Flashback.objects.filter(event_member__event=models.OuterRef("pk")), "event_member__event"
+        ),
+        members_count=count_subquery(EventMember.objects.filter(event=models.OuterRef("pk")), "event"),
+    )
+
+    flashbacks = {}
+    for flashback_id, event_id in Flashback.objects.order_by("pk").values_list("pk", "event_member__event_id"):
+        flashbacks.setdefault(event_id, []).append(flashback_id)
+
+    viewers = list(EventViewer.objects.only("event_id", "seen_until", "seen_ids"))
+    for viewer in viewers:
+        flashbacks_ids = flashbacks.get(viewer.event_id, [])
+        seen_count = bisect_right(flashbacks_ids, viewer.seen_until) + len(
+            {pk for pk in viewer.seen_ids if pk > viewer.seen_until}.intersection(flashbacks_ids)
+        )
+        viewer.unseen_count = len(flashbacks_ids) - seen_count
+    EventViewer.objects.bulk_update(viewers, ["unseen_count"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0020_eventviewer_seen_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='flashbacks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='eventviewer',
+            name='unseen_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
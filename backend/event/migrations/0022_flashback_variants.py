@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0021_event_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
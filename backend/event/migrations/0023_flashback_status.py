@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0022_flashback_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'pending'), (1, 'ready'), (2, 'rejected')], default=1),
+        ),
+    ]
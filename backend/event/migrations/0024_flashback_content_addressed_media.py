@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:20
+
+import event.models
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0023_flashback_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flashback',
+            name='media',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=utils.storage.get_flashback_storage, upload_to=event.models.upload_flashback_to),
+        ),
+    ]
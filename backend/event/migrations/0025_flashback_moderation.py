@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0024_flashback_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashback',
+            name='nsfw_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='flashback',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'pending'), (1, 'ready'), (2, 'rejected'), (3, 'in_review'), (4, 'flagged')], default=1),
+        ),
+        migrations.AddIndex(
+            model_name='flashback',
+            index=models.Index(condition=models.Q(('status', 3)), fields=['created_at'], name='flashback_review_queue_idx'),
+        ),
+    ]
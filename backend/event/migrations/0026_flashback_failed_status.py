@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0025_flashback_moderation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flashback',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'pending'), (1, 'ready'), (2, 'rejected'), (3, 'in_review'), (4, 'flagged'), (5, 'failed')], default=1),
+        ),
+    ]
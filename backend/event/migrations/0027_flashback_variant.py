@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_variants(apps, schema_editor):
+    Flashback = apps.get_model("event", "Flashback")
+    FlashbackVariant = apps.get_model("event", "FlashbackVariant")
+
+    FlashbackVariant.objects.bulk_create(
+        [
+            FlashbackVariant(flashback_id=flashback_id, width=int(width), name=name)
+            for flashback_id, variants in Flashback.objects.exclude(variants={}).values_list("pk", "variants").iterator()
+            for width, name in variants.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0026_flashback_failed_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlashbackVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField()),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('flashback', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variant_files', to='event.flashback')),
+            ],
+            options={
+                'unique_together': {('flashback', 'width')},
+            },
+        ),
+        migrations.RunPython(backfill_variants, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,24 @@
-import uuid, random
-from django.db import models
+import uuid
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Q, F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from enum import Enum
 
-from event.managers import EventQuerySet, FlashbackQuerySet
+from event.managers import EventQuerySet, EventViewerQuerySet, FlashbackQuerySet
 from user.models import User
+from friendship.cache import get_friends_ids
+from friendship.models import FriendshipEdge
+from utils.images import is_valid_image, render_variants, VARIANT_EXTENSIONS
+from utils.storage import get_flashback_storage, lock_name
+from utils.nsfw_detection import is_flagged
 
 
 EVENT_PREVIEW_COUNT_MAX = 3
+EVENT_COUNTER_FIELDS = ("flashbacks_count", "members_count")  # only ever written with F() updates
 
 
 """ Enums and choices """
@@ -26,6 +37,14 @@ class FlashbackVisibilityMode(models.IntegerChoices):
     PUBLIC = 0, "public"
     PRIVATE = 1, "private"
 
+class FlashbackStatus(models.IntegerChoices):
+    PENDING = 0, "pending"
+    READY = 1, "ready"
+    REJECTED = 2, "rejected"
+    IN_REVIEW = 3, "in_review"
+    FLAGGED = 4, "flagged"
+    FAILED = 5, "failed"  # could not be processed, the upload is kept
+
 
 class Event(models.Model):
     objects = EventQuerySet.as_manager()
@@ -39,6 +58,28 @@ class Event(models.Model):
     viewers_mode = models.IntegerField(default=EventViewersMode.ONLY_MEMBERS, choices=EventViewersMode.choices)
     mutual_friends_limit = models.DecimalField(max_digits=5, decimal_places=2, default=None, null=True)
 
+    # last status whose transition hooks have run, see Event.run_lifecycle
+    lifecycle_status = models.IntegerField(default=EventStatus.OPENED.value)
+    lifecycle_lease = models.DateTimeField(default=None, null=True)
+
+    # denormalized, see EventQuerySet.recount
+    flashbacks_count = models.PositiveIntegerField(default=0)
+    members_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["start_at"], name="event_start_at_idx"),
+            models.Index(fields=["end_at"], name="event_end_at_idx"),
+            models.Index(
+                fields=["start_at"], name="event_activate_due_idx",
+                condition=Q(lifecycle_status=EventStatus.OPENED.value)
+            ),
+            models.Index(
+                fields=["end_at"], name="event_close_due_idx",
+                condition=Q(lifecycle_status__lt=EventStatus.CLOSED.value)
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.title} [{self.pk}]"
 
@@ -59,89 +100,145 @@ class Event(models.Model):
         return True
 
     def close(self):
+        from event.tasks import run_event_lifecycle
+
         self.end_at = timezone.now()
-        self.save()
-        self.generate_viewers()
+        self.save(update_fields=["end_at"])
+        transaction.on_commit(lambda: run_event_lifecycle.delay([self.pk]))
+
+    def discount_flashbacks(self, flashbacks_ids: list[int]):
+        """Take ready flashbacks that are about to be deleted out of the event and viewer counters."""
+        if not flashbacks_ids:
+            return
+
+        Event.objects.filter(pk=self.pk).update(flashbacks_count=Greatest(F("flashbacks_count") - len(flashbacks_ids), 0))
+        # only the viewers who had not seen a flashback count it, locked against a concurrent mark_as_seen
+        viewers_by_unseen = defaultdict(list)
+        for viewer in EventViewer.objects.select_for_update().filter(event=self).only("seen_until", "seen_ids"):
+            seen_ids = set(viewer.seen_ids)
+            unseen = sum(1 for pk in flashbacks_ids if pk > viewer.seen_until and pk not in seen_ids)
+            if unseen:
+                viewers_by_unseen[unseen].append(viewer.pk)
+        for unseen, viewers_ids in viewers_by_unseen.items():
+            EventViewer.objects.filter(pk__in=viewers_ids).update(unseen_count=Greatest(F("unseen_count") - unseen, 0))
 
     def on_close(self):
-        self.generate_viewers()
+        self.sync_viewers()
         self.generate_preview()
 
+    def run_lifecycle(self) -> bool:
+        """Run the transition hooks the event has crossed since the last run, at most once per status."""
+        with transaction.atomic():
+            event = Event.objects.select_for_update(skip_locked=True).filter(pk=self.pk).first()
+            if event is None:
+                return False  # another worker is processing the event
+
+            status = event.status
+            ran = status.value > event.lifecycle_status
+            if ran and status == EventStatus.CLOSED:
+                event.on_close()
+
+            if ran: event.lifecycle_status = status.value
+            event.lifecycle_lease = None
+            event.save(update_fields=["lifecycle_status", "lifecycle_lease"])
+        return ran
+
     @property
     def flashbacks(self):
-        return Flashback.objects.filter(
-            event_member_id__in=(ev.id for ev in EventMember.objects.filter(event=self))
-        )
+        return Flashback.objects.filter_ready().filter(event_member__event=self)
 
     def get_friends_members(self, user: User) -> models.QuerySet["EventMember"]:
-        return self.eventmember_set.filter(
-            user__in=[u.get_friend(user).pk for u in user.friendship_set.all()]
-        )
+        return self.eventmember_set.filter(user__in=FriendshipEdge.objects.filter(user=user).values("friend_id"))
 
     def save(self, *args, **kwargs):
         if self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value:
             if self.mutual_friends_limit is None:
                 self.mutual_friends_limit = 0.3
+
+        # a full save would write back a stale copy of the counters over concurrent F() updates
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in EVENT_COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def generate_preview(self):
-        flashbacks = self.flashbacks.all()
-        if self.viewers_mode != EventViewersMode.ONLY_MEMBERS:
-            flashbacks = flashbacks.filter(visibility=FlashbackVisibilityMode.PUBLIC)
-
-        # check the old ones
-        for i, ep in enumerate(self.eventpreview_set.order_by("order")):
-            if i + 1 >= EVENT_PREVIEW_COUNT_MAX or ep.flashback not in flashbacks:
-                ep.delete()
-            flashbacks = flashbacks.exclude(pk=ep.flashback.pk)
-            ep.order = i + 1
-            ep.save()
-
-        # create the new ones
-        ep_count = self.eventpreview_set.count()
-        for i in range(EVENT_PREVIEW_COUNT_MAX - ep_count):
-            if flashbacks.count() == 0:
-                break
-            random_flashback = random.choice(flashbacks)
-            flashbacks = flashbacks.exclude(pk=random_flashback.pk)
-            EventPreview.objects.create(event=self, flashback=random_flashback, order=i + 1 + ep_count)
+        Event.objects.filter(pk=self.pk).generate_previews()
 
     def generate_viewers(self):
-        self._flush_viewers()
-        self._generate_all_members_viewers()  # members should be always viewers
+        with transaction.atomic():
+            self._flush_viewers()
+            self.sync_viewers()
+
+    def sync_viewers(self, users_ids: set[int] = None):
+        """
+        Add or remove only the viewers that differ from the computed viewers set,
+        optionally restricted to users_ids. Viewers who stay keep their seen state.
+        """
+        current_viewers = EventViewer.objects.filter(event=self)
+        if users_ids is not None:
+            current_viewers = current_viewers.filter(user_id__in=users_ids)
+
+        members_ids = self.get_members_ids(users_ids)
+        viewers_ids = members_ids | self.get_friends_viewers_ids(users_ids)  # members should be always viewers
+        current = dict(current_viewers.values_list("user_id", "is_member"))
+
+        with transaction.atomic():
+            current_viewers.exclude(user_id__in=viewers_ids).delete()
+            for is_member in (True, False):
+                current_viewers.filter(
+                    user_id__in=[user_id for user_id in current if (user_id in members_ids) == is_member]
+                ).exclude(is_member=is_member).update(is_member=is_member)
+
+            EventViewer.objects.bulk_create(
+                [
+                    EventViewer(
+                        user_id=user_id, event=self, is_member=user_id in members_ids, unseen_count=self.flashbacks_count
+                    )
+                    for user_id in viewers_ids - current.keys()
+                ],
+                ignore_conflicts=True
+            )
 
-        if (self.viewers_mode == EventViewersMode.ALL_FRIENDS.value or
-           (self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value and self.mutual_friends_limit >= 1)):
-            self._generate_all_friends_viewers()  # mode is ALL_FRIENDS or MUTUAL_FRIENDS with mfl over 1
+    def sync_member_viewers(self, user_id: int):
+        user_id = int(user_id)  # may come from an instance built with a url kwarg
+        # the mutual threshold depends on the members count, so every friend may be affected
+        if self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value and self.mutual_friends_limit < 1:
+            return self.sync_viewers()
 
-        elif self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value:
-            self._generate_mutual_members_viewers()  # MUTUAL_FRIENDS
+        users_ids = {user_id}
+        if self.viewers_mode != EventViewersMode.ONLY_MEMBERS.value:
+            users_ids.update(get_friends_ids(user_id))
+        self.sync_viewers(users_ids)
 
-    def _generate_all_members_viewers(self):
-        for em in self.eventmember_set.all():
-            EventViewer.objects.get_or_create(
-                user=em.user, event=self, is_member=False
-            )
+    @property
+    def mutual_friends_threshold(self) -> int:
+        members_count = self.eventmember_set.count()
+        return round(members_count * ((self.mutual_friends_limit * 10) / 100))
+
+    def get_members_ids(self, users_ids: set[int] = None) -> set[int]:
+        members = self.eventmember_set.all()
+        if users_ids is not None:
+            members = members.filter(user_id__in=users_ids)
+        return set(members.values_list("user_id", flat=True))
+
+    def get_friends_viewers_ids(self, users_ids: set[int] = None) -> set[int]:
+        if self.viewers_mode == EventViewersMode.ONLY_MEMBERS.value:
+            return set()
 
-    def _generate_all_friends_viewers(self):
-        for em in self.eventmember_set.all():
-            for f in em.user.friends:
-                EventViewer.objects.get_or_create(
-                    user=f, event=self, is_member=False
-                )
-
-    def _generate_mutual_members_viewers(self):
-        members_count = len(self.eventmember_set)
-        mutual_friends_limit_c = round(members_count * ((self.mutual_friends_limit * 10) / 100))
-        user_friends_count = {}
-        for em in self.eventmember_set.all():
-            for f in em.user.friends:
-                mfc = user_friends_count.get(f.pk, 0)
-                if mfc is True: continue
-                user_friends_count[f.pk] = mfc + 1
-                if mfc >= mutual_friends_limit_c:
-                    EventViewer.objects.get_or_create(user=f, event=self, is_member=False)
-                    user_friends_count[f.pk] = True
+        # every edge from a member to a friend who is not a member
+        members = self.eventmember_set.values("user_id")
+        friends = FriendshipEdge.objects.filter(user__in=members).exclude(friend__in=members)
+        if users_ids is not None:
+            friends = friends.filter(friend_id__in=users_ids)
+
+        if self.viewers_mode == EventViewersMode.MUTUAL_FRIENDS.value and self.mutual_friends_limit < 1:
+            friends = friends.count_by_friend(members).filter(
+                count__gt=self.mutual_friends_threshold
+            )  # MUTUAL_FRIENDS, GROUP BY friend HAVING count > threshold
+
+        return set(friends.values_list("friend_id", flat=True))  # ALL_FRIENDS or MUTUAL_FRIENDS with mfl over 1
 
     def _flush_viewers(self):
         EventViewer.objects.filter(event=self).delete()
@@ -165,6 +262,7 @@ class EventMember(models.Model):
 
 
 def upload_flashback_to(instance, filename):
+    # only the directory and the extension are kept by ContentAddressedStorage
     extension = filename.split(".")[-1]
     return f"flashback/{uuid.uuid4()}.{extension}"
 
@@ -174,12 +272,133 @@ class Flashback(models.Model):
 
     event_member = models.ForeignKey(EventMember, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
-    media = models.ImageField(upload_to=upload_flashback_to, blank=True, null=True)
+    media = models.ImageField(
+        upload_to=upload_flashback_to, storage=get_flashback_storage, blank=True, null=True, db_index=True
+    )
     visibility = models.IntegerField(default=FlashbackVisibilityMode.PUBLIC, choices=FlashbackVisibilityMode.choices)
+    variants = models.JSONField(default=dict, blank=True)  # width -> storage name, read copy of FlashbackVariant
+    status = models.IntegerField(default=FlashbackStatus.READY, choices=FlashbackStatus.choices)
+    nsfw_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # moderation queue, see event.tasks.moderate_flashbacks
+            models.Index(
+                fields=["created_at"], condition=Q(status=3), name="flashback_review_queue_idx"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.event_member} flashback [{self.id}]"
 
+    def process(self):
+        """Validate an uploaded flashback off the request path, render its variants and queue it for moderation."""
+        if self.status != FlashbackStatus.PENDING:
+            return
+
+        with self.media.open("rb") as file:
+            is_valid = is_valid_image(file, settings.FLASHBACK_UPLOAD_MAX_PIXELS)
+
+        if not is_valid:
+            Flashback.objects.filter(pk=self.pk).update(status=FlashbackStatus.REJECTED, media=None)
+            Flashback.release_media(self.media.name, self.variants)
+            return
+
+        self.generate_variants()
+        Flashback.objects.filter(pk=self.pk, status=FlashbackStatus.PENDING).update(status=FlashbackStatus.IN_REVIEW)
+        self.status = FlashbackStatus.IN_REVIEW
+
+    @staticmethod
+    def apply_verdicts(verdicts: dict[int, float | None]) -> list[int]:
+        """
+        Write the moderation scores back in bulk, flagged flashbacks stay hidden and the others become
+        visible to the viewers. Returns the ids of the published flashbacks.
+        """
+        with transaction.atomic():
+            flashbacks = list(
+                Flashback.objects.select_for_update(of=("self",)).filter(pk__in=verdicts, status=FlashbackStatus.IN_REVIEW)
+                .select_related("event_member").only("pk", "status", "nsfw_score", "event_member__event")
+            )
+            published = Counter()
+            for flashback in flashbacks:
+                flashback.nsfw_score = verdicts[flashback.pk]
+                flashback.status = FlashbackStatus.FLAGGED if is_flagged(flashback.nsfw_score) else FlashbackStatus.READY
+                if flashback.status == FlashbackStatus.READY:
+                    published[flashback.event_member.event_id] += 1
+            Flashback.objects.bulk_update(flashbacks, ["status", "nsfw_score"])
+
+            for event_id, count in published.items():
+                Event.objects.filter(pk=event_id).update(flashbacks_count=F("flashbacks_count") + count)
+                EventViewer.objects.filter(event_id=event_id).update(unseen_count=F("unseen_count") + count)
+        return [flashback.pk for flashback in flashbacks if flashback.status == FlashbackStatus.READY]
+
+    def approve(self):
+        """Publish a flagged flashback after a manual review."""
+        with transaction.atomic():
+            if not Flashback.objects.filter(pk=self.pk, status=FlashbackStatus.FLAGGED).update(status=FlashbackStatus.READY):
+                return
+            event_id = self.event_member.event_id
+            Event.objects.filter(pk=event_id).update(flashbacks_count=F("flashbacks_count") + 1)
+            # a watermark that already moved past the flashback counts it as seen
+            EventViewer.objects.filter(event_id=event_id, seen_until__lt=self.pk).update(unseen_count=F("unseen_count") + 1)
+        self.status = FlashbackStatus.READY
+
+    def request_review(self):
+        """Send a flagged flashback through the classifier again, e.g. after settings.NSFW_CLASSIFIER changed."""
+        from event.tasks import moderate_flashbacks
+
+        if Flashback.objects.filter(pk=self.pk, status=FlashbackStatus.FLAGGED).update(status=FlashbackStatus.IN_REVIEW):
+            self.status = FlashbackStatus.IN_REVIEW
+            transaction.on_commit(moderate_flashbacks.delay)
+
+    def generate_variants(self):
+        if not self.media:
+            return
+
+        image_format = settings.FLASHBACK_VARIANT_FORMAT
+        with self.media.open("rb") as file:
+            rendered = render_variants(file, settings.FLASHBACK_VARIANT_WIDTHS, image_format)
+
+        variants = {}
+        for width, content in rendered.items():
+            variant_name = Flashback.get_variant_name(self.media.name, width, VARIANT_EXTENSIONS[image_format])
+            if not default_storage.exists(variant_name):  # shared with the duplicates of the same content
+                variant_name = default_storage.save(variant_name, content)
+            variants[str(width)] = variant_name
+        self.set_variants(variants)
+
+    @staticmethod
+    def get_variant_name(media_name: str, width: int | str, extension: str) -> str:
+        name = media_name.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        return f"flashback/variants/{name}_{width}.{extension}"
+
+    def set_variants(self, variants: dict[str, str], media_name: str = None):
+        """Store the variants, and optionally a new media name, along with the FlashbackVariant rows used for lookups."""
+        fields = {"variants": variants} if media_name is None else {"variants": variants, "media": media_name}
+        with transaction.atomic():
+            Flashback.objects.filter(pk=self.pk).update(**fields)
+            FlashbackVariant.objects.filter(flashback_id=self.pk).delete()
+            FlashbackVariant.objects.bulk_create(
+                [FlashbackVariant(flashback_id=self.pk, width=int(width), name=name) for width, name in variants.items()]
+            )
+        self.variants = variants
+        if media_name is not None:
+            self.media.name = media_name
+
+    @staticmethod
+    def release_media(name: str, variants: dict):
+        """Delete the stored files once no flashback references the content anymore."""
+        if not name:
+            return
+
+        with transaction.atomic():
+            lock_name(name)  # an upload of the same content waits, or writes the file again after us
+            if Flashback.objects.filter(media=name).exists():
+                return
+            Flashback._meta.get_field("media").storage.delete(name)
+            for variant_name in variants.values():
+                default_storage.delete(variant_name)
+
     @property
     def user(self) -> User:
         return self.event_member.user
@@ -189,6 +408,19 @@ class Flashback(models.Model):
         return self.event_member.event
 
 
+class FlashbackVariant(models.Model):
+    """Where a rendered variant is stored, lets serve_media find the flashbacks a variant belongs to."""
+    flashback = models.ForeignKey(Flashback, on_delete=models.CASCADE, related_name="variant_files")
+    width = models.PositiveIntegerField()
+    name = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        unique_together = ("flashback", "width")
+
+    def __str__(self) -> str:
+        return f"{self.flashback} variant {self.width}"
+
+
 class EventPreview(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     flashback = models.ForeignKey(Flashback, on_delete=models.CASCADE)
@@ -211,33 +443,50 @@ class EventPreview(models.Model):
 
 
 class EventViewer(models.Model):
+    objects = EventViewerQuerySet.as_manager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     is_member = models.BooleanField(default=False)
 
-    class Meta:
-        unique_together = ("user", "event")
-
-    def __str__(self):
-        return f"{self.user} -> [{self.event}]"
-
-    def generate_flashback_viewer(self):
-        for user in self.event.eventmember_set.all():
-            for flashback in user.flashback_set.all():
-                fv, created = FlashbackViewer.objects.get_or_create(event_viewer=self, flashback=flashback)
-                if not created and fv.is_seen:
-                    fv.is_seen = False
-                    fv.save()
+    # seen state: every flashback with pk <= seen_until plus the ones in seen_ids
+    seen_until = models.BigIntegerField(default=0)
+    seen_ids = models.JSONField(default=list)
 
-
-class FlashbackViewer(models.Model):
-    event_viewer = models.ForeignKey(EventViewer, on_delete=models.CASCADE)
-    flashback = models.ForeignKey(Flashback, on_delete=models.CASCADE)
-    is_seen = models.BooleanField(default=False)
+    # denormalized, see EventViewerQuerySet.recount_unseen
+    unseen_count = models.PositiveIntegerField(default=0)
 
     class Meta:
-        unique_together = ("event_viewer", "flashback")
+        unique_together = ("user", "event")
 
     def __str__(self):
-        return f"[{self.event_viewer}] -> {self.flashback}"
+        return f"{self.user} -> [{self.event}]"
 
+    @property
+    def seen_q(self) -> Q:
+        return Q(pk__lte=self.seen_until) | Q(pk__in=self.seen_ids)
+
+    def mark_as_seen(self, *flashbacks_ids: int):
+        with transaction.atomic():
+            viewer = EventViewer.objects.select_for_update().get(pk=self.pk)
+            newly_seen = {pk for pk in flashbacks_ids if pk > viewer.seen_until and pk not in viewer.seen_ids}
+            seen_ids = {pk for pk in (*viewer.seen_ids, *flashbacks_ids) if pk > viewer.seen_until}
+
+            # move the watermark over the leading run of seen flashbacks, a pending one stops it
+            flashbacks = Flashback.objects.filter(event_member__event_id=self.event_id).exclude(
+                status__in=[FlashbackStatus.REJECTED, FlashbackStatus.FLAGGED, FlashbackStatus.FAILED]
+            )
+            for flashback_id in flashbacks.filter(pk__gt=viewer.seen_until).order_by("pk").values_list(
+                "pk", flat=True
+            )[:len(seen_ids) + 1]:
+                if flashback_id not in seen_ids:
+                    break
+                viewer.seen_until = flashback_id
+                seen_ids.remove(flashback_id)
+
+            viewer.seen_ids = sorted(pk for pk in seen_ids if pk > viewer.seen_until)
+            viewer.unseen_count = Greatest(F("unseen_count") - len(newly_seen), 0)  # a drifted counter stops at 0
+            viewer.save(update_fields=["seen_until", "seen_ids", "unseen_count"])
+            viewer.refresh_from_db(fields=["unseen_count"])
+
+        self.seen_until, self.seen_ids, self.unseen_count = viewer.seen_until, viewer.seen_ids, viewer.unseen_count
@@ -0,0 +1,6 @@
+from rest_framework.pagination import CursorPagination
+
+
+class EventViewerCursorPagination(CursorPagination):
+    page_size = 20
+    ordering = ("-end_at", "-pk")  # end_at is annotated by EventViewerQuerySet.for_feed
@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import io
+import json
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from PIL import ImageColor
+
+
+POSTER_TEMPLATES = ("soft_light", "soft_dark")
+POSTER_FORMATS = ("pdf", "html")
+QRCODE_FORMATS = ("svg", "png")
+QRCODE_MIME_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+QRCODE_CACHED_COLORS = (("black", "white"), ("white", "black"))
+
+
+def _digest(*inputs) -> str:
+    """Cache key of a rendering, covers every input in full so different inputs never share a file."""
+    return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()[:32]
+
+
+def _cached(name: str, render) -> str:
+    """Return the stored name, rendering and storing the content the first time."""
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(render()))
+    return name
+
+
+def _render_qrcode(data: str, fill: str, bg_color: str, image_format: str) -> bytes:
+    qr = qrcode.QRCode(border=1)
+    qr.add_data(data)
+    if image_format == "svg":
+        base = qrcode.image.svg.SvgPathFillImage
+        factory = type("SvgImage", (base,), {
+            "background": bg_color, "QR_PATH_STYLE": {**base.QR_PATH_STYLE, "fill": fill}
+        })
+        image = qr.make_image(image_factory=factory)
+    else:
+        image = qr.make_image(fill_color=fill, back_color=bg_color)
+    buffer = io.BytesIO()
+    image.save(buffer)
+    return buffer.getvalue()
+
+
+def is_cached_qrcode(fill: str, bg_color: str) -> bool:
+    """Only the QRCODE_CACHED_COLORS pairs are stored, any other colors are rendered on every request."""
+    colors = (ImageColor.getrgb(fill), ImageColor.getrgb(bg_color))
+    return any(colors == (ImageColor.getrgb(a), ImageColor.getrgb(b)) for a, b in QRCODE_CACHED_COLORS)
+
+
+def get_qrcode(event, fill: str = "black", bg_color: str = "white", image_format: str = "svg") -> str:
+    """Storage name of the event QR code, rendered once per (event, url, colors, version), cached colors only."""
+    if not is_cached_qrcode(fill, bg_color):
+        raise ValueError(f"QR code colors {fill}/{bg_color} are not cached, use render_qrcode.")
+
+    data = settings.EVENT_QRCODE_URL.format(event_id=event.pk)
+    name = f"poster/qrcode/{event.pk}/{_digest(data, fill, bg_color, settings.POSTER_VERSION)}.{image_format}"
+    return _cached(name, lambda: _render_qrcode(data, fill, bg_color, image_format))
+
+
+def render_qrcode(event, fill: str = "black", bg_color: str = "white", image_format: str = "svg") -> bytes:
+    """Content of the event QR code, read from storage for the cached colors."""
+    if not is_cached_qrcode(fill, bg_color):
+        return _render_qrcode(settings.EVENT_QRCODE_URL.format(event_id=event.pk), fill, bg_color, image_format)
+    with default_storage.open(get_qrcode(event, fill, bg_color, image_format), "rb") as file:
+        return file.read()
+
+
+def get_qrcode_data_uri(event, fill: str, bg_color: str, image_format: str = "svg") -> str:
+    content = base64.b64encode(render_qrcode(event, fill, bg_color, image_format)).decode()
+    return f"data:{QRCODE_MIME_TYPES[image_format]};base64,{content}"
+
+
+def get_poster(event, template: str = "soft_light", poster_format: str = "pdf") -> str:
+    """
+    Storage name of the rendered poster. The name carries a digest of everything the poster shows,
+    so a new title or emoji renders a new file, see clear_posters for the old ones.
+    """
+    digest = _digest(event.title, event.emoji, settings.EVENT_QRCODE_URL, settings.POSTER_VERSION)
+    name = f"poster/{event.pk}/{template}_{digest}.{poster_format}"
+
+    def render() -> bytes:
+        html = render_to_string(f"poster/{template}.html", {"event": event})
+        if poster_format == "html":
+            return html.encode()
+
+        from weasyprint import HTML  # needs pango, only the rendering workers have to install it
+        return HTML(string=html).write_pdf()
+
+    return _cached(name, render)
+
+
+def clear_posters(event_id: int):
+    for directory in (f"poster/{event_id}", f"poster/qrcode/{event_id}"):
+        if not default_storage.exists(directory):
+            continue
+
+        for name in default_storage.listdir(directory)[1]:
+            default_storage.delete(f"{directory}/{name}")
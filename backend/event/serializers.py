@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from event import models, validators
+from event.serializers_fields import FlashbackVariantsField
 from user.serializers import UserSerializer, MiniUserSerializer
 from utils.time import humanize_event_time
 
@@ -20,6 +21,12 @@ class EventSerializer(serializers.ModelSerializer):
             "emoji",
             "viewers_mode",
             "mutual_friends_limit",
+            "members_count",
+            "flashbacks_count",
+        ]
+        read_only_fields = [
+            "members_count",
+            "flashbacks_count",
         ]
         ordering = ["start_at", "pk"]
 
@@ -40,12 +47,14 @@ class EventSerializer(serializers.ModelSerializer):
 
 
 class EventPreviewFlashbackSerializer(serializers.ModelSerializer):
+    variants = FlashbackVariantsField()
 
     class Meta:
         model = models.Flashback
         fields = [
             "pk",
-            "media"
+            "media",
+            "variants",
         ]
 
 
@@ -63,7 +72,7 @@ class EventPreviewSerializer(serializers.ModelSerializer):
 
 class EventViewerSerializer(serializers.ModelSerializer):
     event = EventSerializer(read_only=True)
-    flashbacks_count = serializers.SerializerMethodField()
+    flashbacks_count = serializers.IntegerField(source="event.flashbacks_count", read_only=True)
     preview = serializers.SerializerMethodField()
 
     class Meta:
@@ -73,17 +82,15 @@ class EventViewerSerializer(serializers.ModelSerializer):
             "event",
             "flashbacks_count",
             "preview",
-            "is_member"
+            "is_member",
+            "unseen_count",
         ]
 
-    def get_flashbacks_count(self, obj):
-        return obj.event.flashbacks.count()
-
     def get_preview(self, obj):
-        return EventPreviewSerializer(
-            instance=obj.event.eventpreview_set.all().order_by("order"),
-            many=True
-        ).data
+        previews = getattr(obj.event, "ordered_previews", None)
+        if previews is None:
+            previews = obj.event.eventpreview_set.select_related("flashback").order_by("order")
+        return EventPreviewSerializer(instance=previews, many=True).data
 
 
 class EventMemberSerializer(serializers.ModelSerializer):
@@ -95,7 +102,8 @@ class EventMemberSerializer(serializers.ModelSerializer):
 
 
 class FlashbackSerializer(serializers.ModelSerializer):
-    media = serializers.ImageField(required=True)
+    media = serializers.FileField(required=True)  # decoded and verified later by Flashback.process
+    variants = FlashbackVariantsField()
     created_by = serializers.SerializerMethodField()
 
     class Meta:
@@ -103,21 +111,30 @@ class FlashbackSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "media",
+            "variants",
+            "status",
             "created_by",
             "created_at"
         ]
+        read_only_fields = [
+            "status",
+        ]
 
     def get_created_by(self, obj: models.Flashback):
         return UserSerializer(instance=obj.event_member.user).data
 
 
 class FlashbackViewerSerializer(serializers.ModelSerializer):
-    media = serializers.ImageField(required=True)
+    flashback = serializers.IntegerField(source="pk", read_only=True)
+    variants = FlashbackVariantsField()
+    is_seen = serializers.BooleanField(read_only=True)
 
     class Meta:
-        model = models.FlashbackViewer
+        model = models.Flashback
         fields = [
             "id",
             "flashback",
+            "media",
+            "variants",
             "is_seen",
         ]
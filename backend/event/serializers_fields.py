@@ -0,0 +1,14 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+
+class FlashbackVariantsField(serializers.ReadOnlyField):
+    """Urls of the flashback media variants keyed by their width, empty until they are generated."""
+
+    def to_representation(self, value):
+        request = self.context.get("request", None)
+        output = {}
+        for width, name in (value or {}).items():
+            url = default_storage.url(name)
+            output[width] = request.build_absolute_uri(url) if request is not None else url
+        return output
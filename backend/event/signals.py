@@ -0,0 +1,78 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from event.models import Event, EventMember, EventViewersMode, Flashback
+from event.posters import clear_posters
+from friendship.models import Friendship
+
+
+def _sync_member_viewers(event_id: int, user_id: int):
+    event = Event.objects.filter(pk=event_id).first()
+    if event is not None and event.viewers_generated:
+        event.sync_member_viewers(user_id)
+
+
+@receiver(post_save, sender=EventMember)
+def sync_viewers_on_member_add(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _sync_member_viewers(instance.event_id, instance.user_id))
+
+
+@receiver(post_delete, sender=EventMember)
+def sync_viewers_on_member_remove(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _sync_member_viewers(instance.event_id, instance.user_id))
+
+
+def _sync_friendship_viewers(user_a_id: int, user_b_id: int):
+    events = Event.objects.filter(
+        eventmember__user_id__in=(user_a_id, user_b_id), eventviewer__isnull=False
+    ).exclude(viewers_mode=EventViewersMode.ONLY_MEMBERS).distinct()
+
+    for event in events:
+        event.sync_viewers({user_a_id, user_b_id})
+
+
+@receiver(post_save, sender=Friendship)
+def sync_viewers_on_friendship_add(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _sync_friendship_viewers(instance.from_user_id, instance.to_user_id))
+
+
+@receiver(post_delete, sender=Friendship)
+def sync_viewers_on_friendship_remove(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _sync_friendship_viewers(instance.from_user_id, instance.to_user_id))
+
+
+@receiver(pre_save, sender=Event)
+def remember_stored_settings(sender, instance, **kwargs):
+    stored = Event.objects.filter(pk=instance.pk).values_list(
+        "viewers_mode", "mutual_friends_limit", "title", "emoji"
+    ).first() if instance.pk else None
+    instance._stored_viewers_settings = stored[:2] if stored else None
+    instance._stored_poster_fields = stored[2:] if stored else None
+
+
+@receiver(post_save, sender=Event)
+def clear_posters_on_change(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_poster_fields", None)
+    if stored is not None and stored != (instance.title, instance.emoji):
+        transaction.on_commit(lambda: clear_posters(instance.pk))
+
+
+@receiver(post_save, sender=Event)
+def sync_viewers_on_settings_change(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_viewers_settings", None)
+    limit = instance.mutual_friends_limit
+    current = (instance.viewers_mode, None if limit is None else Decimal(str(limit)))
+    if created or stored is None or stored == current:
+        return
+    if instance.viewers_generated:
+        transaction.on_commit(lambda: Event.objects.get(pk=instance.pk).sync_viewers())
+
+
+@receiver(post_delete, sender=Flashback)
+def release_flashback_media(sender, instance, **kwargs):
+    name, variants = instance.media.name, instance.variants
+    transaction.on_commit(lambda: Flashback.release_media(name, variants))
@@ -0,0 +1,82 @@
+import time
+from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from event.models import Event, Flashback, FlashbackStatus
+from utils import nsfw_detection
+
+
+@shared_task
+def dispatch_event_lifecycle():
+    """
+    Scan for events that crossed start_at/end_at, lease them and fan them out in chunks,
+    so a spike of events ending at once is spread over the lifecycle workers.
+    """
+    now = timezone.now()
+    events_ids = list(
+        Event.objects.filter_lifecycle_due(now).values_list("pk", flat=True)[:settings.EVENT_LIFECYCLE_DISPATCH_LIMIT]
+    )
+    Event.objects.filter(pk__in=events_ids).update(lifecycle_lease=now + settings.EVENT_LIFECYCLE_LEASE)
+
+    chunk_size = settings.EVENT_LIFECYCLE_CHUNK_SIZE
+    for i in range(0, len(events_ids), chunk_size):
+        run_event_lifecycle.delay(events_ids[i:i + chunk_size])
+    return len(events_ids)
+
+
+@shared_task(bind=True, max_retries=5, acks_late=True)
+def run_event_lifecycle(self, events_ids: list[int]):
+    failed_ids = []
+    for event in Event.objects.filter(pk__in=events_ids):
+        try: event.run_lifecycle()
+        except Exception: failed_ids.append(event.pk)
+
+    if failed_ids:
+        raise self.retry(args=(failed_ids,), countdown=2 ** self.request.retries * 10)
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True)
+def process_flashback_uploads(self, flashbacks_ids: list[int]):
+    failed_ids = []
+    for flashback in Flashback.objects.filter(pk__in=flashbacks_ids).select_related("event_member"):
+        try: flashback.process()
+        except Exception: failed_ids.append(flashback.pk)
+    moderate_flashbacks.delay()
+
+    if failed_ids and self.request.retries < self.max_retries:
+        raise self.retry(args=(failed_ids,), countdown=2 ** self.request.retries * 10)
+
+    # a pending flashback stops the seen watermark of every viewer, don't leave it pending for good
+    Flashback.objects.filter(pk__in=failed_ids, status=FlashbackStatus.PENDING).update(status=FlashbackStatus.FAILED)
+
+
+@shared_task(acks_late=True)
+def moderate_flashbacks():
+    """
+    Classify the oldest batch of flashbacks waiting for review and publish the safe ones,
+    queues itself again while the batch comes back full.
+    """
+    batch_size = settings.NSFW_BATCH_SIZE
+    flashbacks = list(
+        Flashback.objects.filter(status=FlashbackStatus.IN_REVIEW).order_by("created_at")
+        .only("pk", "created_at", "media", "variants")[:batch_size]
+    )
+    if not flashbacks:
+        return 0
+
+    started_at = time.monotonic()
+    lag = (timezone.now() - flashbacks[0].created_at).total_seconds()
+    paths = []
+    for flashback in flashbacks:
+        smallest = min(flashback.variants, key=int, default=None)  # decoding the smallest variant is enough
+        paths.append(default_storage.path(flashback.variants[smallest]) if smallest else flashback.media.path)
+
+    scores = nsfw_detection.classify(paths)
+    Flashback.apply_verdicts({flashback.pk: score for flashback, score in zip(flashbacks, scores)})
+    nsfw_detection.record_batch(len(flashbacks), time.monotonic() - started_at, lag)
+
+    if len(flashbacks) == batch_size:
+        moderate_flashbacks.delay()
+    return len(flashbacks)
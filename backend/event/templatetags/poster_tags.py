@@ -1,8 +1,9 @@
 from django import template
 
+from event.posters import get_qrcode_data_uri
+
 register = template.Library()
 
 @register.simple_tag
-def generate_qrcode_for_event(event, fill, bg_color):
-    return event.qrcode.generate(fill=fill, bg_color=bg_color)
-
+def generate_qrcode_for_event(event, fill, bg_color, image_format="svg"):
+    return get_qrcode_data_uri(event, fill=fill, bg_color=bg_color, image_format=image_format)
@@ -0,0 +1,369 @@
+import io
+import os
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+from django.db.models import F
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageColor
+from rest_framework.test import APIClient
+
+from event.models import (
+    Event, EventMember, EventViewer, EventViewersMode, Flashback, FlashbackStatus, FlashbackVisibilityMode
+)
+from event.posters import clear_posters, get_qrcode, render_qrcode
+from event.tasks import moderate_flashbacks, process_flashback_uploads
+from friendship.models import Friendship
+from utils.uploads import LimitedImageUploadHandler
+from user.models import User
+
+
+class EventCountersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user", email="user@flashbacks.com")
+        now = timezone.now()
+        cls.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+
+    def test_saving_a_stale_event_keeps_the_counters(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        Event.objects.filter(pk=self.event.pk).update(flashbacks_count=F("flashbacks_count") + 3, members_count=2)
+
+        with self.captureOnCommitCallbacks():
+            stale.close()
+        stale.title = "renamed"
+        stale.save()
+
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual((event.flashbacks_count, event.members_count), (3, 2))
+        self.assertEqual((event.title, event.end_at), ("renamed", stale.end_at))
+
+    def test_mark_as_seen_with_a_drifted_unseen_count(self):
+        member = EventMember.objects.create(event=self.event, user=self.user)
+        flashbacks = [Flashback.objects.create(event_member=member) for _ in range(2)]
+        viewer = EventViewer.objects.create(event=self.event, user=self.user, is_member=True, unseen_count=1)
+
+        viewer.mark_as_seen(*[flashback.pk for flashback in flashbacks])
+        self.assertEqual(viewer.unseen_count, 0)
+        self.assertEqual(viewer.seen_until, flashbacks[-1].pk)
+
+
+class FlashbackProcessingTestCase(TestCase):
+    def test_unreadable_upload_is_not_left_pending(self):
+        user = User.objects.create(username="user", email="user@flashbacks.com")
+        now = timezone.now()
+        event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        member = EventMember.objects.create(event=event, user=user)
+        flashback = Flashback.objects.create(
+            event_member=member, media="flashback/missing.jpg", status=FlashbackStatus.PENDING
+        )
+
+        with mock.patch.object(Flashback, "process", side_effect=OSError) as process, \
+                mock.patch.object(moderate_flashbacks, "delay"):
+            process_flashback_uploads.apply(args=([flashback.pk],))  # eager, the retries run right away
+        self.assertEqual(process.call_count, process_flashback_uploads.max_retries + 1)
+        flashback.refresh_from_db()
+        self.assertEqual(flashback.status, FlashbackStatus.FAILED)
+
+
+def _noise_png(name: str, size: int = 200) -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (size, size), os.urandom(size * size * 3)).save(buffer, "PNG")  # ~120kB, doesn't compress
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(FLASHBACK_BULK_UPLOAD_MAX_SIZE=150 * 1024)
+class BulkUploadLimitsTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="user", email="user@flashbacks.com")
+        now = timezone.now()
+        self.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        EventMember.objects.create(event=self.event, user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def upload(self):
+        return self.client.post(
+            f"/api/event/{self.event.pk}/flashback/bulk/", {"media": [_noise_png("a.png"), _noise_png("b.png")]},
+            format="multipart"
+        )
+
+    def test_declared_length_over_the_limit_is_refused_up_front(self):
+        with mock.patch.object(LimitedImageUploadHandler, "receive_data_chunk") as receive_data_chunk:
+            response = self.upload()
+        self.assertEqual(response.status_code, 413)
+        receive_data_chunk.assert_not_called()
+        self.assertFalse(Flashback.objects.exists())
+
+    def test_streamed_files_over_the_limit_stop_the_upload(self):
+        with mock.patch.object(LimitedImageUploadHandler, "form_overhead", 1024 * 1024):  # let the body through
+            response = self.upload()
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Flashback.objects.exists())
+
+
+class FlashbackMediaTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SERVING="django")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.viewer, self.stranger = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com") for i in range(2)
+        ]
+        now = timezone.now()
+        event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        member = EventMember.objects.create(event=event, user=self.viewer)
+        self.flashback = Flashback(event_member=member)
+        self.flashback.media.save("a.png", ContentFile(_noise_png("a.png", 64).read()))
+        self.flashback.generate_variants()
+
+    def get(self, name: str, user: User):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f"/api/media/{name}")
+
+    def test_variants_are_served_to_viewers_only(self):
+        self.assertEqual(len(self.flashback.variants), len(settings.FLASHBACK_VARIANT_WIDTHS))
+        for name in [self.flashback.media.name, *self.flashback.variants.values()]:
+            self.assertEqual(self.get(name, self.viewer).status_code, 200)
+            self.assertEqual(self.get(name, self.stranger).status_code, 404)
+
+    def test_hidden_flashbacks_and_other_media_are_not_served(self):
+        EventViewer.objects.create(event=self.flashback.event_member.event, user=self.stranger)
+        self.assertEqual(self.get(self.flashback.media.name, self.stranger).status_code, 200)
+
+        for status_, visibility in [(FlashbackStatus.FLAGGED, FlashbackVisibilityMode.PUBLIC),
+                                    (FlashbackStatus.READY, FlashbackVisibilityMode.PRIVATE)]:
+            Flashback.objects.filter(pk=self.flashback.pk).update(status=status_, visibility=visibility)
+            for name in [self.flashback.media.name, *self.flashback.variants.values()]:
+                self.assertEqual(self.get(name, self.stranger).status_code, 404)
+        self.assertEqual(self.get(self.flashback.media.name, self.viewer).status_code, 200)  # private, still a member
+
+        poster = default_storage.save("poster/1/soft_light.html", ContentFile(b"<html></html>"))
+        self.assertEqual(self.get(poster, self.viewer).status_code, 404)
+
+    def test_rehashed_media_keeps_its_variants(self):
+        # lay the flashback out like before content addressing, under a random name
+        storage = Flashback._meta.get_field("media").storage
+        legacy_name = "flashback/0f8fad5b-d9cb-469f-a165-70867728950e.png"
+        with storage.open(self.flashback.media.name, "rb") as file:
+            FileSystemStorage._save(storage, legacy_name, file)
+        storage.delete(self.flashback.media.name)
+        for name in self.flashback.variants.values():
+            default_storage.delete(name)
+        Flashback.objects.filter(pk=self.flashback.pk).update(media=legacy_name)
+        self.flashback.refresh_from_db()
+        self.flashback.generate_variants()
+        legacy_variants = self.flashback.variants
+
+        call_command("rehash_media", stdout=io.StringIO())
+        self.flashback.refresh_from_db()
+        self.assertNotEqual(self.flashback.media.name, legacy_name)
+        self.assertEqual(self.flashback.variants.keys(), legacy_variants.keys())
+        self.assertEqual(
+            set(self.flashback.variant_files.values_list("name", flat=True)), set(self.flashback.variants.values())
+        )
+        for name in legacy_variants.values():
+            self.assertFalse(default_storage.exists(name))
+        for name in self.flashback.variants.values():
+            self.assertEqual(self.get(name, self.viewer).status_code, 200)
+            self.assertEqual(self.get(name, self.stranger).status_code, 404)
+
+
+class FlaggedFlashbackTestCase(TestCase):
+    def setUp(self):
+        self.owner, self.viewer = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com") for i in range(2)
+        ]
+        self.staff = User.objects.create(username="staff", email="staff@flashbacks.com", is_staff=True)
+        now = timezone.now()
+        self.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        member = EventMember.objects.create(event=self.event, user=self.owner)
+        self.flashback = Flashback.objects.create(event_member=member, status=FlashbackStatus.FLAGGED)
+        EventViewer.objects.create(event=self.event, user=self.viewer)
+
+    def post(self, user: User, action: str):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(f"/api/event/{self.event.pk}/flashback/{self.flashback.pk}/{action}/")
+
+    def test_staff_approves(self):
+        self.assertEqual(self.post(self.owner, "approve").status_code, 403)
+        self.assertEqual(self.post(self.staff, "approve").status_code, 200)
+
+        self.flashback.refresh_from_db()
+        self.assertEqual(self.flashback.status, FlashbackStatus.READY)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).flashbacks_count, 1)
+        self.assertEqual(EventViewer.objects.get(user=self.viewer).unseen_count, 1)
+
+    def test_owner_requests_review(self):
+        self.assertEqual(self.post(self.viewer, "review").status_code, 404)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.post(self.owner, "review").status_code, 202)
+
+        self.flashback.refresh_from_db()
+        self.assertEqual(self.flashback.status, FlashbackStatus.IN_REVIEW)
+        self.assertEqual(len(callbacks), 1)
+
+
+class PosterCacheTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_only_cached_colors_are_stored(self):
+        now = timezone.now()
+        event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+
+        for fill in ("rgb(1,23,4)", "rgb(12,3,4)"):
+            content = render_qrcode(event, fill=fill, image_format="png")
+            self.assertEqual(Image.open(io.BytesIO(content)).convert("RGB").getpixel((15, 15)), ImageColor.getrgb(fill))
+        self.assertFalse(default_storage.exists(f"poster/qrcode/{event.pk}"))
+
+        name = get_qrcode(event, fill="#000", bg_color="white", image_format="png")
+        self.assertEqual(get_qrcode(event, fill="#000", bg_color="white", image_format="png"), name)
+        clear_posters(event.pk)
+        self.assertFalse(default_storage.exists(name))
+
+
+class MemberApiTestCase(TestCase):
+    def setUp(self):
+        self.host, self.guest, self.friend = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com") for i in range(3)
+        ]
+        Friendship.objects.create(from_user=self.guest, to_user=self.friend)
+        now = timezone.now()
+        self.event = Event.objects.create(
+            title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1), viewers_mode=EventViewersMode.ALL_FRIENDS
+        )
+        EventMember.objects.create(event=self.event, user=self.host)
+        self.event.generate_viewers()
+        self.client = APIClient()
+        self.client.force_authenticate(self.host)
+
+    def test_add_member(self):
+        with mock.patch("friendship.signals.refresh_friend_suggestions") as refresh_friend_suggestions, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/event/{self.event.pk}/member/{self.guest.pk}/add/")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([member["user"]["id"] for member in response.json()], [self.host.pk, self.guest.pk])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).members_count, 1)
+        refresh_friend_suggestions.delay.assert_called_once_with(sorted([self.host.pk, self.guest.pk]))
+        self.assertEqual(
+            set(EventViewer.objects.filter(event=self.event).values_list("user_id", flat=True)),
+            {self.host.pk, self.guest.pk, self.friend.pk}
+        )
+
+    def test_string_ids_are_accepted(self):
+        EventMember.objects.create(event=self.event, user=self.guest)
+        cache.clear()  # load the friends from the database
+        self.event.sync_member_viewers(str(self.guest.pk))
+        self.assertTrue(EventViewer.objects.filter(event=self.event, user=self.friend).exists())
+
+    def test_remove_member_discounts_their_flashbacks(self):
+        member = EventMember.objects.create(event=self.event, user=self.guest)
+        self.event.sync_member_viewers(self.guest.pk)
+        flashbacks = [Flashback.objects.create(event_member=member) for _ in range(3)]
+        Flashback.objects.create(event_member=member, status=FlashbackStatus.FLAGGED)  # never counted
+        Event.objects.filter(pk=self.event.pk).update(flashbacks_count=3, members_count=2)
+        EventViewer.objects.filter(event=self.event).update(unseen_count=3)
+        EventViewer.objects.get(event=self.event, user=self.friend).mark_as_seen(flashbacks[0].pk)
+
+        with mock.patch("friendship.signals.refresh_friend_suggestions"), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/event/{self.event.pk}/member/{self.guest.pk}/")
+        self.assertEqual(response.status_code, 204)
+
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual((event.flashbacks_count, event.members_count), (0, 1))
+        self.assertEqual(set(EventViewer.objects.filter(event=self.event).values_list("unseen_count", flat=True)), {0})
+        self.assertEqual(Event.objects.filter(pk=self.event.pk).recount(), 0)
+
+
+class ViewersGenerationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com") for i in range(11)]
+        cls.members, outsiders = users[:6], users[6:]
+        # outsiders with 0 to 3 friends among the members, one with a friend among the outsiders only
+        for i, outsider in enumerate(outsiders[:4]):
+            for member in cls.members[:i]:
+                Friendship.objects.create(from_user=member, to_user=outsider)
+        Friendship.objects.create(from_user=outsiders[3], to_user=outsiders[4])
+        Friendship.objects.create(from_user=cls.members[0], to_user=cls.members[1])
+
+    @staticmethod
+    def legacy_viewers_ids(event: Event) -> set[int]:
+        """The per member loops generate_viewers replaced."""
+        members = [member.user for member in event.eventmember_set.all()]
+        viewers_ids = {user.pk for user in members}
+        limit = event.mutual_friends_limit
+        mutual = event.viewers_mode == EventViewersMode.MUTUAL_FRIENDS
+        if event.viewers_mode == EventViewersMode.ALL_FRIENDS or (mutual and limit >= 1):
+            viewers_ids.update(friend.pk for user in members for friend in user.friends)
+        elif mutual:
+            limit_count = round(len(members) * ((limit * 10) / 100))
+            friends_count = Counter(friend.pk for user in members for friend in user.friends)
+            viewers_ids.update(pk for pk, count in friends_count.items() if count > limit_count)
+        return viewers_ids
+
+    def test_matches_the_legacy_generation(self):
+        now = timezone.now()
+        for viewers_mode, limit in [(EventViewersMode.ONLY_MEMBERS, None), (EventViewersMode.ALL_FRIENDS, None),
+                                    (EventViewersMode.MUTUAL_FRIENDS, 0.9), (EventViewersMode.MUTUAL_FRIENDS, 2)]:
+            with self.subTest(viewers_mode=viewers_mode, mutual_friends_limit=limit):
+                event = Event.objects.create(
+                    title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1),
+                    viewers_mode=viewers_mode, mutual_friends_limit=limit
+                )
+                for user in self.members:
+                    EventMember.objects.create(event=event, user=user)
+                event.refresh_from_db()
+                event.generate_viewers()
+
+                viewers = dict(EventViewer.objects.filter(event=event).values_list("user_id", "is_member"))
+                self.assertEqual(viewers.keys(), self.legacy_viewers_ids(event))
+                self.assertEqual({pk for pk, is_member in viewers.items() if is_member}, {user.pk for user in self.members})
+
+
+
+class FeedQueriesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="viewer", email="viewer@flashbacks.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_events(self, count: int):
+        """Events the user views, each with a host and two previewed flashbacks."""
+        now = timezone.now()
+        for _ in range(count):
+            event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+            host = User.objects.create(username=f"host{event.pk}", email=f"host{event.pk}@flashbacks.com")
+            member = EventMember.objects.create(event=event, user=host)
+            for _ in range(2):
+                Flashback.objects.create(event_member=member)
+            Event.objects.filter(pk=event.pk).generate_previews()
+            EventViewer.objects.create(event=event, user=self.user)
+
+    def test_to_view_queries_do_not_grow_with_the_page(self):
+        for count in (2, 8):
+            self.add_events(count - EventViewer.objects.filter(user=self.user).count())
+            with self.subTest(events=count), self.assertNumQueries(2):
+                results = self.client.get("/api/event/to_view/").json()["results"]
+            self.assertEqual(len(results), count)
+            self.assertEqual({len(viewer["preview"]) for viewer in results}, {2})
@@ -1,17 +1,30 @@
-from django.db.models import QuerySet
+import posixpath
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet, F
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions, status, mixins
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, NotAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from PIL import ImageColor
 
 from event.serializers import EventSerializer, EventMemberSerializer, FlashbackSerializer, FlashbackViewerSerializer, EventViewerSerializer
-from event.models import EventMember, EventMemberRole, EventViewer, FlashbackViewer
+from event.models import Event, EventMember, EventMemberRole, EventViewer, Flashback, FlashbackStatus
 from event.permissions import IsEventHost
+from event.pagination import EventViewerCursorPagination
+from event.tasks import process_flashback_uploads
+from event.posters import (
+    POSTER_TEMPLATES, POSTER_FORMATS, QRCODE_FORMATS, QRCODE_MIME_TYPES, get_poster, get_qrcode, is_cached_qrcode, render_qrcode
+)
 from user.serializers import UserSerializer
 from utils.shortcuts import get_object_or_exception
+from utils.media import media_response
+from utils.uploads import LimitedImageUploadHandler
 from utils.views import parse_boolean_value
 from utils import constants as cnst
 
@@ -32,18 +45,24 @@ class EventViewSet(viewsets.ModelViewSet):
         return output
 
     def perform_create(self, serializer) -> None:
-        instance = serializer.save()
-        EventMember.objects.create(user=self.request.user, event=instance, role=EventMemberRole.HOST)
+        with transaction.atomic():
+            instance = serializer.save()
+            EventMember.objects.create(user=self.request.user, event=instance, role=EventMemberRole.HOST)
+            Event.objects.filter(pk=instance.pk).update(members_count=F("members_count") + 1)
+        instance.refresh_from_db(fields=["members_count"])
 
     def get_queryset(self) -> QuerySet:
         qs = self.request.user.events.order_by("-start_at")
 
+        # ordering by status, then by start
+        if self.request.query_params.get("ordering", None) == "status":
+            qs = qs.order_by_status("-start_at")
+
         # filtering by status
         status_filter = self.request.query_params.get("status", None)
         if status_filter is not None:
-            try: status_filter = int(status_filter)
+            try: qs = qs.filter_by_status(status=int(status_filter))
             except ValueError: return qs
-            qs = qs.filter_by_status(status=status_filter)
         return qs
 
     @action(detail=True, methods=["post"])
@@ -52,10 +71,38 @@ class EventViewSet(viewsets.ModelViewSet):
         event.close()
         return Response(self.get_serializer(instance=event).data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"])
+    def poster(self, request, pk):
+        event = get_object_or_404(self.get_queryset(), pk=pk)
+        template = request.query_params.get("template", POSTER_TEMPLATES[0])
+        poster_format = request.query_params.get("type", POSTER_FORMATS[0])
+        if template not in POSTER_TEMPLATES or poster_format not in POSTER_FORMATS:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        return media_response(request, default_storage, get_poster(event, template, poster_format), private=True)
+
+    @action(detail=True, methods=["get"])
+    def qrcode(self, request, pk):
+        event = get_object_or_404(self.get_queryset(), pk=pk)
+        fill = request.query_params.get("fill", "black")
+        bg_color = request.query_params.get("bg_color", "white")
+        image_format = request.query_params.get("type", QRCODE_FORMATS[0])
+        try: ImageColor.getrgb(fill), ImageColor.getrgb(bg_color)
+        except ValueError: return Response(status=status.HTTP_400_BAD_REQUEST)
+        if image_format not in QRCODE_FORMATS:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if is_cached_qrcode(fill, bg_color):
+            return media_response(request, default_storage, get_qrcode(event, fill, bg_color, image_format), private=True)
+
+        response = HttpResponse(render_qrcode(event, fill, bg_color, image_format), content_type=QRCODE_MIME_TYPES[image_format])
+        response["Cache-Control"] = "private, max-age=3600"
+        return response
+
     @action(detail=False, methods=["get"])
     def to_view(self, request, **kwargs):
-        ev = EventViewer.objects.filter(user=self.request.user).order_by("-event__end_at").order_by("is_member")
-        return Response(self.get_serializer(ev, many=True).data, status=status.HTTP_200_OK)
+        ev = EventViewer.objects.filter(user=self.request.user).for_feed()
+        paginator = EventViewerCursorPagination()
+        page = paginator.paginate_queryset(ev, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
 
     @action(detail=True, methods=["get"])
     def get_friends_members(self, request, pk):
@@ -88,31 +135,110 @@ class EventFlashbackViewSet(mixins.ListModelMixin,
             return FlashbackSerializer
         return FlashbackViewerSerializer
 
+    def get_event_viewer(self) -> EventViewer:
+        return get_object_or_exception(
+            EventViewer.objects.select_related("event"), PermissionDenied(),
+            event__pk=self.kwargs.get("event_id"), user=self.request.user
+        )
+
     def get_queryset(self):
-        event_viewer = get_object_or_exception(EventViewer.objects.all(), PermissionDenied(), event__pk=self.kwargs.get("event_id"))
-        queryset = FlashbackViewer.objects.filter(event_viewer=event_viewer)
+        event_viewer = self.get_event_viewer()
+        queryset = event_viewer.event.flashbacks.filter_visible_to(self.request.user)
+        queryset = queryset.annotate_seen(event_viewer).order_by("created_at")
 
         if self.action == cnst.ACTION_LIST:
             is_seen_filter = parse_boolean_value(self.request.query_params.get("is_seen", "false"))
-            queryset = queryset.filter(is_seen=is_seen_filter)
+            queryset = queryset.filter_by_seen(event_viewer, is_seen=is_seen_filter)
 
         return queryset
 
-    def perform_create(self, serializer):
-        event_member = get_object_or_exception(
+    def initialize_request(self, request, *args, **kwargs):
+        # uploads are streamed to disk and limited while streaming, see Flashback.process for the full validation
+        request.upload_handlers = [LimitedImageUploadHandler(
+            request, max_size=settings.FLASHBACK_UPLOAD_MAX_SIZE, max_pixels=settings.FLASHBACK_UPLOAD_MAX_PIXELS,
+            max_request_size=settings.FLASHBACK_UPLOAD_MAX_SIZE
+        )]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_event_member(self) -> EventMember:
+        return get_object_or_exception(
             EventMember.objects.all(), PermissionDenied(), event__pk=self.kwargs.get("event_id", None), user=self.request.user
         )
 
-        serializer.save(event_member=event_member)
+    def create(self, request, *args, **kwargs):
+        self.event_member = self.get_event_member()  # before the body is read
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        with transaction.atomic():  # the media and its row, see lock_name
+            instance = serializer.save(event_member=self.event_member, status=FlashbackStatus.PENDING)
+        transaction.on_commit(lambda: process_flashback_uploads.delay([instance.pk]))
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request, event_id):
+        """Upload many flashbacks in one multipart request, with a result for every file."""
+        event_member = self.get_event_member()  # before the body is read
+        upload_handler = request.upload_handlers[0]
+        upload_handler.skip_invalid = True
+        upload_handler.max_files = settings.FLASHBACK_BULK_UPLOAD_MAX
+        upload_handler.max_request_size = settings.FLASHBACK_BULK_UPLOAD_MAX_SIZE
+
+        files = request.FILES.getlist("media")
+
+        flashbacks = []
+        with transaction.atomic():  # the media and their rows, see lock_name
+            for file in files:
+                instance = Flashback(event_member=event_member, status=FlashbackStatus.PENDING)
+                instance.media.save(file.name, file, save=False)
+                flashbacks.append(instance)
+            Flashback.objects.bulk_create(flashbacks)
+            transaction.on_commit(lambda: process_flashback_uploads.delay([f.pk for f in flashbacks]))
+
+        results = upload_handler.rejected + [
+            {"index": file.upload_index, "name": file.name, "id": f.pk, "status": f.status}
+            for file, f in zip(files, flashbacks)
+        ]
+        response_status = status.HTTP_202_ACCEPTED if flashbacks else status.HTTP_400_BAD_REQUEST
+        return Response({"results": sorted(results, key=lambda r: r["index"])}, status=response_status)
+
+    def get_flagged_flashback(self) -> Flashback:
+        flashbacks = Flashback.objects.filter(event_member__event_id=self.kwargs.get("event_id"), status=FlashbackStatus.FLAGGED)
+        if not self.request.user.is_staff:
+            flashbacks = flashbacks.filter(event_member__user=self.request.user)
+        return get_object_or_404(flashbacks.select_related("event_member"), pk=self.kwargs.get("pk"))
+
+    @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser])
+    def approve(self, request, event_id, pk):
+        """Un-flag a flashback the classifier got wrong."""
+        flashback = self.get_flagged_flashback()
+        flashback.approve()
+        return Response(FlashbackSerializer(instance=flashback, context=self.get_serializer_context()).data)
 
     @action(detail=True, methods=["post"])
-    def mark_as_seen(self, request, pk):
-        flashback_viewer = get_object_or_exception(
-            FlashbackViewer.objects.all(), PermissionDenied(), user=self.request.user, pk=pk
+    def review(self, request, event_id, pk):
+        """Let the owner, or staff, send a flagged flashback through moderation again."""
+        flashback = self.get_flagged_flashback()
+        flashback.request_review()
+        return Response(
+            FlashbackSerializer(instance=flashback, context=self.get_serializer_context()).data,
+            status=status.HTTP_202_ACCEPTED
         )
 
-        flashback_viewer.is_seen = True
-        flashback_viewer.save()
+    @action(detail=True, methods=["get"])
+    def upload_status(self, request, event_id, pk):
+        flashback = get_object_or_404(Flashback.objects.filter(event_member=self.get_event_member()), pk=pk)
+        return Response(FlashbackSerializer(instance=flashback, context=self.get_serializer_context()).data)
+
+    @action(detail=True, methods=["post"])
+    def mark_as_seen(self, request, event_id, pk):
+        event_viewer = self.get_event_viewer()
+        flashback = get_object_or_404(event_viewer.event.flashbacks, pk=pk)
+        event_viewer.mark_as_seen(flashback.pk)
+
+        instance = event_viewer.event.flashbacks.annotate_seen(event_viewer).get(pk=flashback.pk)
+        return Response(self.get_serializer(instance=instance).data, status=status.HTTP_200_OK)
 
 
 class MemberViewSet(mixins.ListModelMixin,
@@ -121,6 +247,7 @@ class MemberViewSet(mixins.ListModelMixin,
                     viewsets.GenericViewSet):
 
     lookup_field = "user__pk"
+    lookup_value_regex = r"\d+"
     serializer_class = EventMemberSerializer
     permission_classes = [IsAuthenticated]
 
@@ -129,6 +256,15 @@ class MemberViewSet(mixins.ListModelMixin,
         event = get_object_or_exception(self.request.user.events, PermissionDenied(), pk=event_id)
         return EventMember.objects.filter(event=event)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # the member's flashbacks go with them, take them out of the counters first
+            instance.event.discount_flashbacks(list(
+                Flashback.objects.filter_ready().filter(event_member=instance).values_list("pk", flat=True)
+            ))
+            instance.delete()
+            Event.objects.filter(pk=instance.event_id).update(members_count=F("members_count") - 1)
+
     def destroy(self, request, *args, **kwargs):
         response = super().destroy(request, *args, **kwargs)
         response.data = self.serializer_class(instance=self.get_queryset(), many=True).data
@@ -136,9 +272,12 @@ class MemberViewSet(mixins.ListModelMixin,
 
     @action(detail=True, methods=["post"])
     def add(self, request, *args, **kwargs) -> Response:
-        user_id = kwargs.get("user__pk")
+        user_id = int(kwargs["user__pk"])  # the signals mix it with ids from the database
         event_id = self.kwargs.get("event_id")
-        event_member, _ = EventMember.objects.get_or_create(user_id=user_id, event_id=event_id)
+        with transaction.atomic():
+            event_member, created = EventMember.objects.get_or_create(user_id=user_id, event_id=event_id)
+            if created:
+                Event.objects.filter(pk=event_id).update(members_count=F("members_count") + 1)
         response_data = self.serializer_class(instance=self.get_queryset(), many=True).data
         return Response(response_data, status=status.HTTP_201_CREATED)
 
@@ -148,3 +287,24 @@ class MemberViewSet(mixins.ListModelMixin,
         serializer = UserSerializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+
+PUBLIC_MEDIA_DIRECTORIES = ("user_profile/",)
+
+
+@api_view(["GET", "HEAD"])
+def serve_media(request, path: str):
+    storage = Flashback._meta.get_field("media").storage
+    path = posixpath.normpath(path).lstrip("/")
+    if path.startswith("..") or not storage.exists(path):
+        raise Http404()
+
+    if path.startswith(PUBLIC_MEDIA_DIRECTORIES):
+        return media_response(request, storage, path)
+    if not path.startswith("flashback/"):
+        raise Http404()  # posters and other files are served by their own endpoints
+
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    if not Flashback.objects.filter_by_media_name(path).filter_visible_to(request.user).exists():
+        raise Http404()
+    return media_response(request, storage, path, private=True)
@@ -0,0 +1,48 @@
+from array import array
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(user_id: int) -> str:
+    return f"friends:v{settings.FRIENDS_CACHE_VERSION}:{user_id}"
+
+
+def _pack(friends_ids) -> bytes:
+    friends_ids = sorted(friends_ids)
+    typecode = "I" if not friends_ids or friends_ids[-1] < 2 ** 32 else "Q"
+    return typecode.encode() + array(typecode, friends_ids).tobytes()
+
+
+def _unpack(value: bytes) -> set[int]:
+    friends_ids = array(chr(value[0]))
+    friends_ids.frombytes(value[1:])
+    return set(friends_ids)
+
+
+def get_many_friends_ids(users_ids) -> dict[int, set[int]]:
+    """Friend ids of every user, one cache round trip and at most one query for the missing users."""
+    from friendship.models import FriendshipEdge
+
+    users_ids = {int(user_id) for user_id in users_ids}  # the rows below come back with int ids
+    cached = cache.get_many([_key(user_id) for user_id in users_ids])
+    output = {user_id: _unpack(cached[_key(user_id)]) for user_id in users_ids if _key(user_id) in cached}
+
+    missing = users_ids - output.keys()
+    if missing:
+        loaded = {user_id: set() for user_id in missing}
+        for user_id, friend_id in FriendshipEdge.objects.filter(user_id__in=missing).values_list("user_id", "friend_id"):
+            loaded[user_id].add(friend_id)
+        cache.set_many(
+            {_key(user_id): _pack(friends_ids) for user_id, friends_ids in loaded.items()},
+            settings.FRIENDS_CACHE_TIMEOUT
+        )
+        output.update(loaded)
+    return output
+
+
+def get_friends_ids(user_id: int) -> set[int]:
+    return get_many_friends_ids([user_id])[int(user_id)]
+
+
+def invalidate_friends_ids(*users_ids: int):
+    cache.delete_many([_key(user_id) for user_id in users_ids])
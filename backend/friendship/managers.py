@@ -1,4 +1,8 @@
-from django.db.models import QuerySet, Q
+import heapq
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet, Q, Count
 
 
 class FriendRequestQuerySet(QuerySet):
@@ -23,29 +27,102 @@ class FriendRequestQuerySet(QuerySet):
 class FriendshipQuerySet(QuerySet):
 
     def filter_by_user(self, user):
-        return self.filter(
-            Q(to_user=user) | Q(from_user=user)
-        )
+        return self.filter(edges__user=user)
 
     def get(self, *args, **kwargs):
-        from friendship.models import Friendship
-
         user_a, user_b = kwargs.get("user_a", None), kwargs.get("user_b", None)
         if user_a and user_b:
-            try:
-                return self.get(to_user=user_a, from_user=user_b)
-            except Friendship.DoesNotExist:
-                pass
-            try:
-                return self.get(to_user=user_b, from_user=user_a)
-            except Friendship.DoesNotExist:
-                return None
+            return self.filter(edges__user=user_a, edges__friend=user_b).first()
         return super().get(*args, **kwargs)
 
     def get_mutual_friends(self, user_a, user_b):
-        output = []
-        for friendship in user_a.friendship_set.all():
-            friend = friendship.get_friend(user_a)
-            if self.get(user_a=friend, user_b=user_b) and (friend != user_a and friend != user_b):
-                output.append(friend)
-        return output
+        from friendship.models import FriendshipEdge
+        from user.models import User
+
+        return list(User.objects.filter(pk__in=FriendshipEdge.objects.mutual_friends_ids(user_a, user_b)))
+
+
+class FriendshipEdgeQuerySet(QuerySet):
+
+    def mutual_friends_ids(self, user_a, user_b) -> QuerySet:
+        """Ids of the common friends as a subquery, the intersection is done by the database."""
+        return self.filter(
+            user=user_a, friend__in=self.model.objects.filter(user=user_b).values("friend_id")
+        ).values("friend_id")
+
+    def count_by_friend(self, users) -> QuerySet:
+        """For every friend of the users, how many of the users they are friends with."""
+        return self.filter(user__in=users).values("friend_id").annotate(count=Count("user_id"))
+
+    def count_mutual_friends(self, user, users_ids) -> dict[int, int]:
+        """Mutual friends count of the user with each of the users in one statement, users without any are left out."""
+        friends = self.model.objects.filter(user=user).values("friend_id")
+        return dict(self.filter(friend__in=users_ids).count_by_friend(friends).values_list("friend_id", "count"))
+
+
+class FriendSuggestionQuerySet(QuerySet):
+
+    def refresh(self, users_ids) -> int:
+        """
+        Recompute the top suggestions of the users: friends of friends and people met at the same events,
+        scored by the mutual friends and the shared events. Returns the number of stored suggestions.
+        """
+        from event.models import EventMember
+        from friendship.cache import get_many_friends_ids
+        from friendship.models import FriendRequest
+        from user.models import User
+
+        users_ids = set(users_ids)
+        friends = get_many_friends_ids(users_ids)
+        friends_of_friends = get_many_friends_ids(set().union(*friends.values()))
+
+        mutual = defaultdict(Counter)
+        for user_id in users_ids:
+            for friend_id in friends[user_id]:
+                mutual[user_id].update(friends_of_friends[friend_id])
+
+        # crowded events say little about who knows whom
+        users_by_event = defaultdict(list)
+        for event_id, user_id in EventMember.objects.filter(
+            user_id__in=users_ids, event__members_count__lte=settings.FRIEND_SUGGESTIONS_MAX_EVENT_MEMBERS
+        ).values_list("event_id", "user_id"):
+            users_by_event[event_id].append(user_id)
+
+        shared_events = defaultdict(Counter)
+        for event_id, member_id in EventMember.objects.filter(event_id__in=users_by_event).values_list("event_id", "user_id"):
+            for user_id in users_by_event[event_id]:
+                shared_events[user_id][member_id] += 1
+
+        excluded = {user_id: {user_id, *friends[user_id]} for user_id in users_ids}
+        for from_user_id, to_user_id in FriendRequest.objects.filter(
+            Q(from_user__in=users_ids) | Q(to_user__in=users_ids)
+        ).values_list("from_user_id", "to_user_id"):
+            excluded.get(from_user_id, set()).add(to_user_id)
+            excluded.get(to_user_id, set()).add(from_user_id)
+
+        candidates = {user_id: (mutual[user_id].keys() | shared_events[user_id].keys()) - excluded[user_id] for user_id in users_ids}
+        active_ids = set(User.objects.filter(pk__in=set().union(*candidates.values()), is_active=True).values_list("pk", flat=True))
+
+        suggestions = []
+        for user_id in users_ids:
+            def score(candidate_id: int) -> float:
+                return (
+                    mutual[user_id][candidate_id] * settings.FRIEND_SUGGESTIONS_MUTUAL_WEIGHT +
+                    shared_events[user_id][candidate_id] * settings.FRIEND_SUGGESTIONS_EVENT_WEIGHT
+                )
+
+            ranked = heapq.nlargest(
+                settings.FRIEND_SUGGESTIONS_COUNT, candidates[user_id] & active_ids, key=lambda pk: (score(pk), -pk)
+            )
+            for rank, candidate_id in enumerate(ranked, start=1):
+                suggestions.append(self.model(
+                    user_id=user_id, suggested_id=candidate_id, rank=rank, score=score(candidate_id),
+                    mutual_friends_count=mutual[user_id][candidate_id], events_count=shared_events[user_id][candidate_id]
+                ))
+
+        with transaction.atomic():
+            # concurrent refreshes of the same users take turns, in pk order so they can't deadlock
+            list(User.objects.select_for_update().filter(pk__in=users_ids).order_by("pk").values_list("pk", flat=True))
+            self.model.objects.filter(user_id__in=users_ids).delete()
+            self.model.objects.bulk_create(suggestions, batch_size=1000)
+        return len(suggestions)
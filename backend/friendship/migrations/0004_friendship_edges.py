@@ -0,0 +1,51 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_edges(apps, schema_editor):
+    # a pair stored in both directions keeps only its older friendship
+    Friendship = apps.get_model("friendship", "Friendship")
+    FriendshipEdge = apps.get_model("friendship", "FriendshipEdge")
+
+    pairs, duplicates, edges = set(), [], []
+    for pk, from_user_id, to_user_id in Friendship.objects.order_by("date", "pk").values_list(
+        "pk", "from_user_id", "to_user_id"
+    ).iterator():
+        pair = (min(from_user_id, to_user_id), max(from_user_id, to_user_id))
+        if pair in pairs or from_user_id == to_user_id:
+            duplicates.append(pk)
+            continue
+        pairs.add(pair)
+        edges.append(FriendshipEdge(friendship_id=pk, user_id=from_user_id, friend_id=to_user_id))
+        edges.append(FriendshipEdge(friendship_id=pk, user_id=to_user_id, friend_id=from_user_id))
+
+    Friendship.objects.filter(pk__in=duplicates).delete()
+    FriendshipEdge.objects.bulk_create(edges, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friendship', '0003_friendship_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendshipEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('friendship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='friendship.friendship')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='friendshipedge',
+            constraint=models.UniqueConstraint(fields=('user', 'friend'), name='friendship_edge_unique'),
+        ),
+        migrations.RunPython(create_edges, migrations.RunPython.noop),
+    ]
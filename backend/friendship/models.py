@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from user.models import User
-from friendship.managers import FriendshipQuerySet, FriendRequestQuerySet
+from friendship.managers import (
+    FriendshipQuerySet, FriendRequestQuerySet, FriendshipEdgeQuerySet, FriendSuggestionQuerySet
+)
 
 
 class Friendship(models.Model):
@@ -18,12 +20,42 @@ class Friendship(models.Model):
     def __str__(self):
         return f"{self.to_user} -> {self.from_user}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            if created:
+                FriendshipEdge.objects.bulk_create([
+                    FriendshipEdge(friendship=self, user_id=self.from_user_id, friend_id=self.to_user_id),
+                    FriendshipEdge(friendship=self, user_id=self.to_user_id, friend_id=self.from_user_id),
+                ])
+
     def get_friend(self, user_to_compare, default=None):
         if user_to_compare == self.from_user: return self.to_user
         if user_to_compare == self.to_user: return self.from_user
         return default
 
 
+class FriendshipEdge(models.Model):
+    """
+    Both directions of every friendship, so "are A and B friends" is one probe and "friends of A"
+    is one range scan of the (user, friend) index. Written together with the friendship, see Friendship.save.
+    """
+    objects = FriendshipEdgeQuerySet.as_manager()
+
+    friendship = models.ForeignKey(Friendship, on_delete=models.CASCADE, related_name="edges")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "friend"], name="friendship_edge_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.friend_id}"
+
+
 class FriendRequest(models.Model):
     objects = FriendRequestQuerySet.as_manager()
 
@@ -48,9 +80,28 @@ class FriendRequest(models.Model):
             return
 
         if self.status == FriendRequest.StatusChoices.ACCEPTED:
-            return Friendship.objects.get_or_create(
-                from_user=self.from_user,
-                to_user=self.to_user
-            ) and self.delete()
+            if Friendship.objects.get(user_a=self.from_user, user_b=self.to_user) is None:
+                Friendship.objects.create(from_user=self.from_user, to_user=self.to_user)
+            return self.delete()
 
         self.delete()
+
+
+class FriendSuggestion(models.Model):
+    """Precomputed "people you may know" of every user, rebuilt by FriendSuggestionQuerySet.refresh."""
+    objects = FriendSuggestionQuerySet.as_manager()
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    mutual_friends_count = models.PositiveIntegerField(default=0)
+    events_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "rank"], name="friend_suggestion_rank_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -[{self.rank}]-> {self.suggested_id}"
@@ -0,0 +1,6 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FriendSuggestionCursorPagination(CursorPagination):
+    page_size = 20
+    ordering = ("rank",)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from friendship.models import FriendRequest, Friendship
+from friendship.models import FriendRequest, Friendship, FriendSuggestion
 from user.serializers import UserSerializer
 
 
@@ -33,3 +33,15 @@ class FriendshipSerializer(serializers.ModelSerializer):
     def get_with_user(self, obj):
         other = obj.get_friend(self.context['request'].user)
         return None if not other else BasicUserSerializer(instance=other).data
+
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    user = UserSerializer(source="suggested")
+
+    class Meta:
+        model = FriendSuggestion
+        fields = [
+            "user",
+            "mutual_friends_count",
+            "events_count",
+        ]
@@ -1,9 +1,53 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from friendship.models import FriendRequest
+from event.models import EventMember
+from friendship.cache import invalidate_friends_ids, get_many_friends_ids
+from friendship.models import FriendRequest, Friendship
+from friendship.tasks import refresh_friend_suggestions
 
 
 @receiver(post_save, sender=FriendRequest)
 def check_friend_request_status(sender, instance, **kwargs):
-    instance.process()
\ No newline at end of file
+    instance.process()
+
+
+def _on_friendship_change(user_a_id: int, user_b_id: int):
+    invalidate_friends_ids(user_a_id, user_b_id)
+
+    # both users and their friends gain or lose a friend of friend
+    users_ids = {user_a_id, user_b_id}.union(*get_many_friends_ids([user_a_id, user_b_id]).values())
+    refresh_friend_suggestions.delay(sorted(users_ids))
+
+
+@receiver(post_save, sender=Friendship)
+def invalidate_friends_on_friendship_add(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _on_friendship_change(instance.from_user_id, instance.to_user_id))
+
+
+@receiver(post_delete, sender=Friendship)
+def invalidate_friends_on_friendship_remove(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _on_friendship_change(instance.from_user_id, instance.to_user_id))
+
+
+def _on_membership_change(event_id: int, user_id: int):
+    members_ids = list(
+        EventMember.objects.filter(event_id=event_id).values_list("user_id", flat=True)
+        [:settings.FRIEND_SUGGESTIONS_MAX_EVENT_MEMBERS + 1]
+    )
+    if len(members_ids) <= settings.FRIEND_SUGGESTIONS_MAX_EVENT_MEMBERS:
+        refresh_friend_suggestions.delay(sorted({int(user_id), *members_ids}))
+
+
+@receiver(post_save, sender=EventMember)
+def refresh_suggestions_on_member_add(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _on_membership_change(instance.event_id, instance.user_id))
+
+
+@receiver(post_delete, sender=EventMember)
+def refresh_suggestions_on_member_remove(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _on_membership_change(instance.event_id, instance.user_id))
@@ -12,11 +12,23 @@ class FriendshipStatus(Enum):
     NONE = 3
 
 
-def get_friendship_status(user_from: "User", user_to: "User") -> FriendshipStatus:
-    from friendship.models import FriendRequest
+def get_friendship_statuses(user_from: "User", users_ids) -> dict[int, FriendshipStatus]:
+    """Status of the user with each of the users, one query for the friends and one for the requests."""
+    from django.db.models import Q
+    from friendship.models import FriendRequest, FriendshipEdge
+
+    users_ids = set(users_ids)
+    output = dict.fromkeys(users_ids, FriendshipStatus.NONE)
+    for from_user_id, to_user_id in FriendRequest.objects.filter(
+        Q(from_user=user_from, to_user__in=users_ids) | Q(to_user=user_from, from_user__in=users_ids)
+    ).values_list("from_user_id", "to_user_id"):
+        if from_user_id == user_from.pk: output[to_user_id] = FriendshipStatus.REQUEST_FROM_ME
+        else: output[from_user_id] = FriendshipStatus.REQUEST_TO_ME
+
+    for friend_id in FriendshipEdge.objects.filter(user=user_from, friend__in=users_ids).values_list("friend_id", flat=True):
+        output[friend_id] = FriendshipStatus.FRIENDS
+    return output
 
-    if user_from.is_friend_with(user_to): return FriendshipStatus.FRIENDS
-    friend_request = FriendRequest.objects.get(user_a=user_from, user_b=user_to)
-    if friend_request is None: return FriendshipStatus.NONE
-    if friend_request.from_user == user_from: return FriendshipStatus.REQUEST_FROM_ME
-    return FriendshipStatus.REQUEST_TO_ME
+
+def get_friendship_status(user_from: "User", user_to: "User") -> FriendshipStatus:
+    return get_friendship_statuses(user_from, [user_to.pk])[user_to.pk]
@@ -0,0 +1,20 @@
+from celery import shared_task
+from django.conf import settings
+
+from friendship.models import FriendSuggestion
+from user.models import User
+
+
+@shared_task
+def dispatch_friend_suggestions():
+    """Rebuild the suggestions of every active user, in chunks spread over the workers."""
+    users_ids = list(User.objects.filter(is_active=True).order_by("pk").values_list("pk", flat=True))
+    batch_size = settings.FRIEND_SUGGESTIONS_BATCH_SIZE
+    for i in range(0, len(users_ids), batch_size):
+        refresh_friend_suggestions.delay(users_ids[i:i + batch_size])
+    return len(users_ids)
+
+
+@shared_task(acks_late=True)
+def refresh_friend_suggestions(users_ids: list[int]):
+    return FriendSuggestion.objects.refresh(users_ids)
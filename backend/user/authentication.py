@@ -0,0 +1,80 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class LocalCache:
+    """Small thread safe LRU with a TTL, in front of the shared cache to skip its round trip."""
+
+    def __init__(self, maxsize: int, timeout: float):
+        self.maxsize, self.timeout = maxsize, timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, 0))
+            if expires_at < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# other processes keep their entries until TOKEN_AUTH_LOCAL_CACHE_TIMEOUT, keep it short
+local_cache = LocalCache(settings.TOKEN_AUTH_LOCAL_CACHE_SIZE, settings.TOKEN_AUTH_LOCAL_CACHE_TIMEOUT)
+
+
+def _key(token_key: str) -> str:
+    return f"auth_token:{hashlib.sha256(token_key.encode()).hexdigest()}"
+
+
+def get_token_user(token_key: str):
+    """User of the token from the local cache, then the shared cache and at last the database, None if unknown."""
+    key = _key(token_key)
+    user = local_cache.get(key)
+    if user is None:
+        user = cache.get(key)
+        if user is None:
+            token = Token.objects.select_related("user").filter(key=token_key).first()
+            if token is None:
+                return None
+            user = token.user
+            cache.set(key, user, settings.TOKEN_AUTH_CACHE_TIMEOUT)
+        local_cache.set(key, user)
+    return copy.copy(user)  # requests must not share the cached instance
+
+
+def invalidate_tokens(*tokens_keys: str):
+    keys = [_key(token_key) for token_key in tokens_keys]
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many(keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = get_token_user(key)
+        if user is None:
+            raise AuthenticationFailed("Invalid token.")
+        if not user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        return user, Token(key=key, user=user)
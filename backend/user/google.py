@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import threading
+import time
+import jwt
+import requests
+from django.conf import settings
+
+
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class KeySet:
+    """
+    Google's ID token signing keys (JWKS), kept in memory and on disk until the max-age Google sends runs out.
+    A token signed by an unknown key forces a refresh, at most once per min_refresh_interval, so rotated keys
+    are picked up without letting forged key ids hammer the endpoint. Stale keys are served when a refresh fails.
+    """
+
+    def __init__(self, url: str, cache_path: str, min_refresh_interval: float = 60, default_max_age: float = 3600):
+        self.url, self.cache_path = url, cache_path
+        self.min_refresh_interval, self.default_max_age = min_refresh_interval, default_max_age
+        self._keys, self._expires_at, self._refreshed_at = None, 0.0, 0.0
+        self._lock = threading.Lock()
+
+    def fetch(self) -> tuple[list[dict], float]:
+        """Download the key set, returns the keys and their max-age in seconds."""
+        response = requests.get(self.url, timeout=5)
+        response.raise_for_status()
+        max_age = MAX_AGE.search(response.headers.get("Cache-Control", ""))
+        return response.json()["keys"], float(max_age.group(1)) if max_age else self.default_max_age
+
+    def _read_disk(self):
+        try:
+            with open(self.cache_path) as file:
+                data = json.load(file)
+            self._keys, self._expires_at = {key["kid"]: key for key in data["keys"]}, data["expires_at"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _write_disk(self):
+        data = {"keys": list(self._keys.values()), "expires_at": self._expires_at}
+        try:
+            with open(f"{self.cache_path}.tmp", "w") as file:
+                json.dump(data, file)
+            os.replace(f"{self.cache_path}.tmp", self.cache_path)  # readers never see a half written file
+        except OSError:
+            pass
+
+    def _refresh(self):
+        self._refreshed_at = time.monotonic()
+        try:
+            keys, max_age = self.fetch()
+        except (requests.RequestException, ValueError, KeyError):
+            return
+        self._keys, self._expires_at = {key["kid"]: key for key in keys}, time.time() + max_age
+        self._write_disk()
+
+    def get_key(self, kid: str) -> jwt.PyJWK | None:
+        with self._lock:
+            if self._keys is None:
+                self._read_disk()
+
+            is_expired = self._keys is None or self._expires_at < time.time()
+            is_unknown = self._keys is None or kid not in self._keys
+            if is_expired or (is_unknown and time.monotonic() - self._refreshed_at > self.min_refresh_interval):
+                self._refresh()
+
+            key = (self._keys or {}).get(kid)
+        return jwt.PyJWK(key) if key is not None else None
+
+
+google_key_set = KeySet(
+    settings.GOOGLE_JWKS_URL, settings.GOOGLE_JWKS_CACHE_PATH, settings.GOOGLE_JWKS_MIN_REFRESH_INTERVAL
+)
+
+
+def verify_google_id_token(token: str) -> dict:
+    """Claims of a Google ID token verified locally (signature, audience, issuer, expiry), raises jwt.InvalidTokenError."""
+    key = google_key_set.get_key(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise jwt.InvalidTokenError("Unknown signing key.")
+
+    claims = jwt.decode(
+        token, key=key.key, algorithms=["RS256"],
+        audience=settings.GOOGLE_CLIENT_IDS, issuer=GOOGLE_ISSUERS, leeway=settings.GOOGLE_ID_TOKEN_LEEWAY,
+        options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+    )
+    if not claims.get("email_verified", False):
+        raise jwt.InvalidTokenError("Email is not verified.")
+    return claims
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # matches Django's UPPER(...) LIKE for icontains/istartswith and the % similarity operator
+    'CREATE INDEX IF NOT EXISTS user_username_trgm_idx ON user_user USING gin (UPPER("username"::text) gin_trgm_ops)',
+]
+POSTGRESQL_BACKWARD = ["DROP INDEX IF EXISTS user_username_trgm_idx"]
+
+# external content FTS5 table kept in sync by triggers, Django drops them when it remakes user_user on SQLite,
+# recreate them by running this migration backwards and forwards after such a change
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE user_search USING fts5(username, content='user_user', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER user_search_insert AFTER INSERT ON user_user BEGIN
+        INSERT INTO user_search(rowid, username) VALUES (new.id, new.username);
+    END""",
+    """CREATE TRIGGER user_search_delete AFTER DELETE ON user_user BEGIN
+        INSERT INTO user_search(user_search, rowid, username) VALUES ('delete', old.id, old.username);
+    END""",
+    """CREATE TRIGGER user_search_update AFTER UPDATE OF username ON user_user BEGIN
+        INSERT INTO user_search(user_search, rowid, username) VALUES ('delete', old.id, old.username);
+        INSERT INTO user_search(rowid, username) VALUES (new.id, new.username);
+    END""",
+    "INSERT INTO user_search(user_search) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS user_search_insert",
+    "DROP TRIGGER IF EXISTS user_search_delete",
+    "DROP TRIGGER IF EXISTS user_search_update",
+    "DROP TABLE IF EXISTS user_search",
+]
+
+
+def _run(statements: dict):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_user_about'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"postgresql": POSTGRESQL_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _run({"postgresql": POSTGRESQL_BACKWARD, "sqlite": SQLITE_BACKWARD}),
+        ),
+    ]
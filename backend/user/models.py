@@ -28,23 +28,20 @@ class User(AbstractBaseUser, PermissionsMixin):
         return Friendship.objects.filter_by_user(self)
 
     def is_friend_with(self, user):
-        from friendship.models import Friendship
-        return Friendship.objects.get(user_a=self, user_b=user) is not None
+        from friendship.models import FriendshipEdge
+        return FriendshipEdge.objects.filter(user=self, friend=user).exists()
 
     @property
     def events(self) -> models.QuerySet:
-        from event.models import Event, EventMember
+        from event.models import Event
+        return Event.objects.filter(eventmember__user=self)
 
-        return Event.objects.filter(
-            pk__in=[em.event.pk for em in EventMember.objects.filter(user=self)]
-        )
+    @property
+    def friends_ids(self) -> set[int]:
+        from friendship.cache import get_friends_ids
+        return get_friends_ids(self.pk)
 
     @property
     def friends(self) -> models.QuerySet:
-        from friendship.models import Friendship
-
-        return User.objects.filter(
-            id__in=[
-                fs.get_friend(self).id for fs in self.friendship_set
-            ]
-        )
+        from friendship.models import FriendshipEdge
+        return User.objects.filter(id__in=FriendshipEdge.objects.filter(user=self).values("friend_id"))
@@ -0,0 +1,71 @@
+import base64
+import json
+from django.db import connection
+from django.db.models import Q, Case, When, Value, Exists, OuterRef, BooleanField, IntegerField, QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from friendship.models import FriendshipEdge
+from user.models import User
+
+
+EXACT, PREFIX, FUZZY = 0, 2, 4  # match tiers, a connection to the searching user adds nothing, a stranger adds 1
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _match_q(query: str) -> Q:
+    """Index backed candidates: pg_trgm GIN index on PostgreSQL, FTS5 trigram shadow table on SQLite."""
+    table = User._meta.db_table
+    if connection.vendor == "postgresql":
+        return Q(username__icontains=query) | Q(RawSQL(
+            f'UPPER("{table}"."username"::text) %% UPPER(%s)', [query], output_field=BooleanField()
+        ))
+    if connection.vendor == "sqlite" and len(query) >= TRIGRAM_MIN_LENGTH:
+        return Q(pk__in=RawSQL(
+            "SELECT rowid FROM user_search WHERE user_search MATCH %s", ['"' + query.replace('"', '""') + '"']
+        ))
+    return Q(username__istartswith=query)
+
+
+def _encode_cursor(user: User) -> str:
+    return base64.urlsafe_b64encode(json.dumps([user.rank, user.username_key, user.pk]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[int, str, int]:
+    rank, username_key, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return int(rank), str(username_key), int(pk)
+
+
+def search_queryset(query: str, user: User) -> QuerySet:
+    friends = FriendshipEdge.objects.filter(user=user).values("friend_id")
+    is_connected = (
+        Exists(FriendshipEdge.objects.filter(user=user, friend=OuterRef("pk"))) |
+        Exists(FriendshipEdge.objects.filter(user=OuterRef("pk"), friend__in=friends))  # friend of a friend
+    )
+    return User.objects.filter(_match_q(query)).exclude(pk=user.pk).annotate(
+        username_key=Lower("username"),
+        rank=Case(
+            When(username__iexact=query, then=Value(EXACT)),
+            When(username__istartswith=query, then=Value(PREFIX)),
+            default=Value(FUZZY),
+            output_field=IntegerField(),
+        ) + Case(When(is_connected, then=Value(0)), default=Value(1), output_field=IntegerField()),
+    ).order_by("rank", "username_key", "pk")
+
+
+def search_users(query: str, user: User, cursor: str = None, page_size: int = 20) -> tuple[list[User], str | None]:
+    """
+    Exact, then prefix, then fuzzy matches, people connected to the user first within each tier.
+    Keyset paginated over (rank, lower(username), pk), raises ValueError on an invalid cursor.
+    """
+    users = search_queryset(query, user)
+    if cursor:
+        rank, username_key, pk = _decode_cursor(cursor)
+        users = users.filter(
+            Q(rank__gt=rank) | Q(rank=rank, username_key__gt=username_key) |
+            Q(rank=rank, username_key=username_key, pk__gt=pk)
+        )
+
+    page = list(users[:page_size + 1])
+    next_cursor = _encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
@@ -2,7 +2,8 @@ from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from django.conf import settings
 
 from user.models import User
-from friendship.status import get_friendship_status
+from friendship.models import FriendshipEdge
+from friendship.status import get_friendship_status, get_friendship_statuses
 
 
 class CreateUserSerializer(ModelSerializer):
@@ -39,23 +40,43 @@ class UserSerializer(ModelSerializer):
 
 class UserPOVSerializer(UserSerializer):
     friendship_status = SerializerMethodField()
+    mutual_friends_count = SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = [
             *UserSerializer.Meta.fields,
-            "friendship_status"
+            "friendship_status",
+            "mutual_friends_count"
         ]
 
     def __init__(self, *args, **kwargs):
         self.user_pov = kwargs.pop("user_pov")
         super().__init__(*args, **kwargs)
 
+    @staticmethod
+    def get_bulk_context(user_pov, users) -> dict:
+        """Context resolving the point of view fields of many users at once, pass it when serializing a list."""
+        users_ids = [user.pk for user in users]
+        return {
+            "friendship_statuses": get_friendship_statuses(user_pov, users_ids),
+            "mutual_friends_counts": FriendshipEdge.objects.count_mutual_friends(user_pov, users_ids),
+        }
+
     def get_friendship_status(self, obj):
+        statuses = self.context.get("friendship_statuses")
+        if statuses is not None and obj.pk in statuses:
+            return statuses[obj.pk].value
         return get_friendship_status(
             user_from=self.user_pov,
             user_to=obj
         ).value
 
+    def get_mutual_friends_count(self, obj) -> int:
+        counts = self.context.get("mutual_friends_counts")
+        if counts is None:
+            counts = FriendshipEdge.objects.count_mutual_friends(self.user_pov, [obj.pk])
+        return counts.get(obj.pk, 0)
+
 
 class MiniUserSerializer(ModelSerializer):
 
@@ -1,6 +1,8 @@
+from django.db import transaction
 from django.db.models import signals
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
+from user.authentication import invalidate_tokens
 from user.models import User
 
 
@@ -9,3 +11,14 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
 
+
+@receiver(signals.post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if not created:  # deactivated or changed, the cached user is stale
+        tokens_keys = list(Token.objects.filter(user=instance).values_list("key", flat=True))
+        transaction.on_commit(lambda: invalidate_tokens(*tokens_keys))
+
+
+@receiver(signals.post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_tokens(instance.key))
@@ -1,3 +1,156 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from event.models import Event, EventMember, Flashback
+from friendship.models import FriendRequest, Friendship
+from user import google
+from user.models import User
+from user.utils import validate_google_token
+
+
+class LazyRelationsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend, cls.other = [
+            User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com") for i in range(3)
+        ]
+        Friendship.objects.create(from_user=cls.user, to_user=cls.friend)
+        Friendship.objects.create(from_user=cls.other, to_user=cls.user)
+
+        now = timezone.now()
+        cls.event = Event.objects.create(title="party", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+        for user in (cls.user, cls.friend):
+            member = EventMember.objects.create(user=user, event=cls.event)
+            Flashback.objects.create(event_member=member)
+        Event.objects.create(title="other", emoji="x", start_at=now, end_at=now + timedelta(hours=1))
+
+    def test_relations_are_single_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.user.events), [self.event])
+        with self.assertNumQueries(1):
+            self.assertCountEqual(self.user.friends, [self.friend, self.other])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.event.flashbacks.count(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual([member.user_id for member in self.event.get_friends_members(self.user)], [self.friend.pk])
+
+    def test_relations_are_lazy(self):
+        with self.assertNumQueries(0):
+            events = self.user.events.order_by("-start_at")
+            friends = self.user.friends.exclude(pk=self.other.pk)
+            flashbacks = self.event.flashbacks.filter(event_member__user=self.friend)
+        with self.assertNumQueries(1):
+            self.assertEqual(events.count(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(friends), [self.friend])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(flashbacks[:10]), 1)
+
+
+class UserListQueriesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="viewer", email="viewer@flashbacks.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_users(self, count: int):
+        """Friends, requests both ways and strangers, so every friendship status shows up."""
+        for _ in range(count):
+            i = User.objects.count()
+            user = User.objects.create(username=f"user{i}", email=f"user{i}@flashbacks.com")
+            if i % 4 == 1:
+                Friendship.objects.create(from_user=self.user, to_user=user)
+            elif i % 4 == 2:
+                FriendRequest.objects.create(from_user=user, to_user=self.user)
+            elif i % 4 == 3:
+                FriendRequest.objects.create(from_user=self.user, to_user=user)
+
+    def test_list_queries_do_not_grow_with_the_users(self):
+        for count in (4, 12):
+            self.add_users(count - User.objects.count())
+            with self.subTest(users=count), self.assertNumQueries(4):
+                users = self.client.get("/api/user/").json()
+            self.assertEqual(len(users), count)
+            self.assertEqual({user["friendship_status"] for user in users}, {0, 1, 2, 3})
+
+
+def _generate_key(kid: str) -> tuple:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    return private_key, {**jwk, "kid": kid, "alg": "RS256", "use": "sig"}
+
+
+@override_settings(GOOGLE_CLIENT_IDS=["flashbacks-client"])
+class GoogleTokenTestCase(SimpleTestCase):
+    """Verifies tokens signed by a local stand-in of Google's key set, nothing leaves the process."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key, cls.jwk = _generate_key("key-1")
+        cls.rotated_private_key, cls.rotated_jwk = _generate_key("key-2")
+
+    def setUp(self):
+        self.cache_path = os.path.join(tempfile.mkdtemp(), "jwks.json")
+        self.published = [self.jwk]
+        self.key_set = self.make_key_set()
+        patcher = mock.patch.object(google, "google_key_set", self.key_set)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_key_set(self) -> google.KeySet:
+        key_set = google.KeySet("https://stand-in/certs", self.cache_path, min_refresh_interval=60)
+        key_set.fetch = mock.Mock(side_effect=lambda: (list(self.published), 3600))
+        return key_set
+
+    def sign(self, private_key=None, kid: str = "key-1", **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com", "aud": "flashbacks-client", "sub": "1234", "iat": now,
+            "exp": now + 3600, "email": "henrich@flashbacks.com", "email_verified": True, **claims
+        }
+        return jwt.encode(payload, private_key or self.private_key, algorithm="RS256", headers={"kid": kid})
+
+    def test_valid_token(self):
+        is_valid, claims = validate_google_token(self.sign())
+        self.assertTrue(is_valid)
+        self.assertEqual(claims["email"], "henrich@flashbacks.com")
+
+    def test_invalid_tokens(self):
+        for token in [
+            self.sign(aud="other-client"),
+            self.sign(iss="https://evil.com"),
+            self.sign(exp=int(time.time()) - 3600),
+            self.sign(email_verified=False),
+            self.sign(private_key=self.rotated_private_key),  # signature does not match key-1
+            "not-a-token",
+        ]:
+            self.assertEqual(validate_google_token(token), (False, {}))
+
+    def test_keys_are_cached_in_memory_and_on_disk(self):
+        validate_google_token(self.sign())
+        validate_google_token(self.sign())
+        self.assertEqual(self.key_set.fetch.call_count, 1)
+
+        key_set = self.make_key_set()  # a fresh process reads the file
+        with mock.patch.object(google, "google_key_set", key_set):
+            self.assertTrue(validate_google_token(self.sign())[0])
+        key_set.fetch.assert_not_called()
+
+    def test_rotated_key_is_fetched_once(self):
+        validate_google_token(self.sign())
+        self.published = [self.jwk, self.rotated_jwk]
+        self.key_set._refreshed_at -= 61
+
+        self.assertTrue(validate_google_token(self.sign(self.rotated_private_key, kid="key-2"))[0])
+        self.assertFalse(validate_google_token(self.sign(kid="key-3"))[0])  # unknown again, inside the interval
+        self.assertEqual(self.key_set.fetch.call_count, 2)
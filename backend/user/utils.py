@@ -1,15 +1,12 @@
 def validate_google_token(token: str) -> [bool, dict]:
-    import requests
+    import jwt
+    from user import google
 
-    url = f"https://www.googleapis.com/oauth2/v3/tokeninfo?access_token={token}"
-    response = requests.get(url)
-
-    if response.status_code != 200:
+    try:
+        return True, google.verify_google_id_token(token)
+    except jwt.InvalidTokenError:
         return False, {}
 
-    response_data = response.json()
-    return True, response_data
-
 
 def get_username_from_email(email: str) -> str:
     return email.split("@")[0]
\ No newline at end of file
@@ -4,13 +4,16 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action, api_view
 from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import replace_query_param
 from django.shortcuts import get_object_or_404
 
 from user.serializers import UserPOVSerializer, CreateUserSerializer, UserSerializer
 from user.models import User
+from user.search import search_users
 from user.utils import validate_google_token, get_username_from_email
-from friendship.models import Friendship, FriendRequest
-from friendship.serializers import FriendRequestSerializer
+from friendship.models import Friendship, FriendRequest, FriendSuggestion
+from friendship.pagination import FriendSuggestionCursorPagination
+from friendship.serializers import FriendRequestSerializer, FriendSuggestionSerializer
 
 
 @api_view(["POST"])
@@ -43,11 +46,17 @@ class UserViewSet(viewsets.ModelViewSet):
         if self.action == "create": return CreateUserSerializer
         if self.action in ("me", "friendship", "search"): return UserSerializer
         if self.action == "requests": return FriendRequestSerializer
+        if self.action == "suggestions": return FriendSuggestionSerializer
         return UserPOVSerializer
 
     def get_serializer(self, *args, **kwargs):
         if self.get_serializer_class().__name__ == "UserPOVSerializer":
             kwargs["user_pov"] = self.request.user
+            if kwargs.get("many", False):
+                users = args[0] if args else kwargs.get("instance")
+                kwargs["context"] = {
+                    **self.get_serializer_context(), **UserPOVSerializer.get_bulk_context(self.request.user, users)
+                }
         return super().get_serializer(*args, **kwargs)
 
     def get_permissions(self):
@@ -74,14 +83,22 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"])
     def search(self, request):
-        search_value = request.GET.get('value')
+        search_value = request.GET.get('value', '').strip()[:settings.USER_SEARCH_MAX_LENGTH]
         if not search_value:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        users = User.objects.filter(username__icontains=search_value).exclude(id=request.user.id)
+        try:
+            users, next_cursor = search_users(
+                search_value, request.user,
+                cursor=request.GET.get("cursor"), page_size=settings.USER_SEARCH_PAGE_SIZE
+            )
+        except (ValueError, TypeError):
+            return Response(data={"cursor": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
         serializer = self.get_serializer(instance=users, many=True)
+        next_url = replace_query_param(request.build_absolute_uri(), "cursor", next_cursor) if next_cursor else None
         return Response(
-            serializer.data, status=status.HTTP_200_OK
+            {"next": next_url, "results": serializer.data}, status=status.HTTP_200_OK
         )
 
     @action(detail=True, methods=["get", "post", "put", "delete"])
@@ -126,11 +143,24 @@ class UserViewSet(viewsets.ModelViewSet):
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=True, methods=["get"])
+    def mutual_friends(self, request, pk):
+        users = Friendship.objects.get_mutual_friends(request.user, self.get_object())
+        serializer = self.get_serializer(instance=users, many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=["get"])
     def my_friends(self, request):
         serializer = self.get_serializer(instance=request.user.friends, many=True)
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["get"])
+    def suggestions(self, request):
+        queryset = FriendSuggestion.objects.filter(user=request.user).select_related("suggested")
+        paginator = FriendSuggestionCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
     @action(detail=False, methods=["get"])
     def requests(self, request):
         instance = FriendRequest.objects.filter(to_user=self.request.user)
@@ -0,0 +1,42 @@
+from io import BytesIO
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+
+
+VARIANT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def is_valid_image(file, max_pixels: int = None) -> bool:
+    """Fully decode the image, False when it's broken or has more than max_pixels."""
+    try:
+        with Image.open(file) as image:
+            image.verify()
+
+        file.seek(0)
+        with Image.open(file) as image:
+            if max_pixels is not None and image.width * image.height > max_pixels:
+                return False
+            image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+def render_variants(file, widths: tuple[int, ...], image_format: str = "WEBP", quality: int = 80) -> dict[int, ContentFile]:
+    """
+    Render fixed width variants of the image, with EXIF orientation applied and metadata stripped.
+    Variants wider than the original are not upscaled.
+    """
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    output = {}
+    for width in sorted(widths):
+        variant = image.copy()
+        if variant.width > width:
+            variant = variant.resize((width, round(variant.height * width / variant.width)), Image.Resampling.LANCZOS)
+
+        buffer = BytesIO()
+        variant.save(buffer, format=image_format, quality=quality)  # no exif/icc passed, so no metadata is kept
+        output[width] = ContentFile(buffer.getvalue())
+    return output
@@ -0,0 +1,92 @@
+import mimetypes
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
+
+
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _read_range(file, length: int, chunk_size: int = 64 * 1024):
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    match = RANGE.match(header)
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if start == "":  # suffix range, the last n bytes
+        return max(size - int(end), 0), size - 1
+    return int(start), min(int(end), size - 1) if end else size - 1
+
+
+def media_response(request, storage, name: str, private: bool = False):
+    """
+    Serve a stored file with ETag/If-None-Match and Range support, or hand it over to the front proxy
+    when settings.MEDIA_SERVING is "x-accel-redirect" or "x-sendfile".
+    Files with a content hash in their name never change, so they are cached as immutable.
+    """
+    content_hash = CONTENT_HASH.search(name)
+    if content_hash is not None:
+        etag = f'"{content_hash.group()}"'
+        cache_control = f"max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        etag = f'"{storage.size(name):x}-{int(storage.get_modified_time(name).timestamp()):x}"'
+        cache_control = "max-age=3600"
+    cache_control = f"{'private' if private else 'public'}, {cache_control}"
+
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SERVING == "x-accel-redirect":
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0])
+        response["X-Accel-Redirect"] = f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX}{name}"
+    elif settings.MEDIA_SERVING == "x-sendfile":
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0])
+        response["X-Sendfile"] = storage.path(name)
+    else:
+        response = _file_response(request, storage, name, etag)
+
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def _file_response(request, storage, name: str, etag: str):
+    size = storage.size(name)
+    byte_range = _parse_range(request.headers.get("Range", ""), size)
+    if request.headers.get("If-Range", etag) != etag:
+        byte_range = None  # the client has another version, send it all
+
+    if byte_range is None:
+        response = FileResponse(storage.open(name, "rb"))  # full files go through wsgi.file_wrapper/sendfile
+    elif byte_range[0] > byte_range[1]:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    else:
+        start, end = byte_range
+        file = storage.open(name, "rb")
+        file.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(file, end - start + 1),
+            status=206,
+            content_type=mimetypes.guess_type(name)[0] or "application/octet-stream"
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(storage.get_modified_time(name).timestamp())
+    return response
@@ -0,0 +1,102 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from PIL import Image, ImageChops
+
+
+logger = logging.getLogger(__name__)
+
+METRICS_CACHE_KEY = "nsfw_detection:metrics"
+
+
+class Classifier:
+    """CPU only image classifier, predict returns the probability that the image is not safe for work."""
+
+    def predict(self, image: Image.Image) -> float:
+        raise NotImplementedError
+
+
+class NullClassifier(Classifier):
+    """The default, publishes every readable image until a real model is plugged in with settings.NSFW_CLASSIFIER."""
+
+    def predict(self, image: Image.Image) -> float:
+        return 0.0
+
+
+class SkinToneClassifier(Classifier):
+    """
+    Deterministic baseline, scores the share of skin toned pixels (YCbCr ranges) in a thumbnail.
+    Flags ordinary portraits too, only meant for testing the moderation flow in development.
+    """
+
+    size = (128, 128)
+
+    def predict(self, image: Image.Image) -> float:
+        image = image.convert("RGB")
+        image.thumbnail(self.size)
+        _, cb, cr = image.convert("YCbCr").split()
+        mask = ImageChops.multiply(
+            cb.point(lambda value: 255 if 77 <= value <= 127 else 0),
+            cr.point(lambda value: 255 if 133 <= value <= 173 else 0),
+        )
+        return mask.histogram()[255] / (mask.width * mask.height)
+
+
+_classifier = None
+_executor = None
+
+
+def get_classifier() -> Classifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = import_string(settings.NSFW_CLASSIFIER)()
+    return _classifier
+
+
+def get_processes() -> int:
+    return settings.NSFW_PROCESSES or os.cpu_count() or 1
+
+
+def _init_worker(classifier_path: str):
+    global _classifier
+    _classifier = import_string(classifier_path)()
+
+
+def _score(path: str) -> float | None:
+    try:
+        with Image.open(path) as image:
+            return get_classifier().predict(image)
+    except OSError:
+        return None
+
+
+def classify(paths: list[str]) -> list[float | None]:
+    """
+    Score the images in a process pool sized to the cores, the pool and the loaded classifiers are kept
+    for the next batches. None means the image could not be read.
+    """
+    global _executor
+    processes = get_processes()
+    if processes == 1 or len(paths) == 1:
+        return [_score(path) for path in paths]
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(settings.NSFW_CLASSIFIER,))
+    return list(_executor.map(_score, paths, chunksize=max(1, len(paths) // (processes * 4))))
+
+
+def is_flagged(score: float | None) -> bool:
+    return score is None or score >= settings.NSFW_THRESHOLD
+
+
+def record_batch(count: int, elapsed: float, lag: float):
+    metrics = {"images": count, "images_per_second": count / elapsed if elapsed else 0.0, "queue_lag": lag}
+    cache.set(METRICS_CACHE_KEY, metrics, None)
+    logger.info("moderated %(images)d images, %(images_per_second).1f images/s, queue lag %(queue_lag).1fs", metrics)
+
+
+def get_last_batch_metrics() -> dict | None:
+    return cache.get(METRICS_CACHE_KEY)
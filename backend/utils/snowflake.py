@@ -0,0 +1,48 @@
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+WORKER_BITS = 8
+SEQUENCE_BITS = 4
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class Snowflake:
+    """
+    Time ordered 53 bit ids, so they stay exact as javascript numbers: milliseconds since EPOCH_MS,
+    worker id and a per millisecond sequence. Unique across processes as long as the running ones
+    have distinct worker ids.
+    """
+
+    def __init__(self, worker_id: int):
+        if not 0 <= worker_id < 1 << WORKER_BITS:
+            raise ImproperlyConfigured(f"Snowflake worker id must be between 0 and {(1 << WORKER_BITS) - 1}.")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def __call__(self) -> int:
+        with self._lock:
+            now = max(int(time.time() * 1000), self._last_ms)  # never go back with the clock
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:  # sequence exhausted, borrow the next millisecond
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+_generator = None
+
+
+def next_id() -> int:
+    global _generator
+    if _generator is None:
+        _generator = Snowflake(settings.SNOWFLAKE_WORKER_ID)
+    return _generator()
@@ -0,0 +1,48 @@
+import hashlib
+import posixpath
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under <directory>/ab/cd/<sha256>.<ext>, so identical content is stored only once and
+    no directory grows past 256 entries. Only the directory and the extension of the requested name are kept.
+    Files are shared, delete them only when nothing references them anymore, see lock_name.
+    """
+
+    @staticmethod
+    def hash_content(content) -> str:
+        digest = getattr(content, "sha256", None)  # already computed while streaming, see LimitedImageUploadHandler
+        if digest is not None:
+            return digest
+
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _save(self, name, content):
+        digest = self.hash_content(content)
+        directory, extension = posixpath.dirname(name), posixpath.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest[2:4], f"{digest}{extension}")
+
+        lock_name(name)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def lock_name(name: str):
+    """
+    Serialize saving and deleting the same stored name until the transaction ends. Save inside the transaction that
+    inserts the referencing row, so a concurrent release either sees that row or deletes the file before it is written
+    again. Postgres only, SQLite is used in development and serializes its writing transactions anyway.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", [name])
+
+
+def get_flashback_storage() -> ContentAddressedStorage:
+    return ContentAddressedStorage()
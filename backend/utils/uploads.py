@@ -0,0 +1,96 @@
+import hashlib
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, SkipFile
+from PIL import ImageFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload is too large."
+    default_code = "upload_too_large"
+
+
+class LimitedImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams the upload to a temporary file chunk by chunk, hashing it on the way, and rejects it as soon as it's over max_size,
+    or as soon as its header declares more than max_pixels. The full decode is left to a background validator.
+    The whole request is failed as soon as its files add up to more than max_request_size bytes or max_files files.
+    """
+    header_max_size = 1024 * 1024  # give up on images whose header is not known after this many bytes
+    form_overhead = 64 * 1024  # multipart boundaries, part headers and the other fields
+
+    def __init__(self, request=None, max_size: int = None, max_pixels: int = None, max_request_size: int = None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.max_pixels = max_pixels
+        self.max_request_size = max_request_size
+        self.max_files = None
+        self.skip_invalid = False  # skip only the invalid file instead of failing the request, see rejected
+        self.rejected = []
+        self.index = -1
+        self.request_received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # a declared length over the limit is refused before a single byte is read
+        if self.max_request_size is not None and content_length > self.max_request_size + self.form_overhead:
+            raise UploadTooLarge(f"Upload is larger than {self.max_request_size} bytes.")
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.index += 1
+        if self.max_files is not None and self.index >= self.max_files:
+            self.file.close()
+            raise ValidationError({self.field_name: f"Upload at most {self.max_files} files at once."})
+        self.received = 0
+        self.hasher = hashlib.sha256()
+        self.header_parser = ImageFile.Parser()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        self.request_received += len(raw_data)
+        if self.max_request_size is not None and self.request_received > self.max_request_size:
+            self.file.close()
+            raise UploadTooLarge(f"Upload is larger than {self.max_request_size} bytes.")
+
+        if self.max_size is not None and self.received > self.max_size:
+            self.reject(f"File is larger than {self.max_size} bytes.")
+
+        if self.header_parser is not None:
+            self.check_header(raw_data)
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.header_parser is not None:
+            try: self.reject("Upload a valid image.")
+            except SkipFile: return None
+
+        file = super().file_complete(file_size)
+        file.upload_index = self.index
+        file.sha256 = self.hasher.hexdigest()  # lets ContentAddressedStorage skip hashing again
+        return file
+
+    def check_header(self, raw_data):
+        try:
+            self.header_parser.feed(raw_data)
+        except OSError:
+            self.reject("Upload a valid image.")
+
+        image = self.header_parser.image
+        if image is None:
+            if self.received > self.header_max_size:
+                self.reject("Upload a valid image.")
+            return
+
+        self.header_parser = None  # header is known, the rest of the body is only written to disk
+        if self.max_pixels is not None and image.width * image.height > self.max_pixels:
+            self.reject(f"Image has more than {self.max_pixels} pixels.")
+
+    def reject(self, message: str):
+        self.file.close()
+        if self.skip_invalid:
+            self.rejected.append({"index": self.index, "name": self.file_name, "error": message})
+            raise SkipFile()
+        raise ValidationError({self.field_name: message})